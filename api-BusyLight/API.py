@@ -17,62 +17,117 @@
 # - Split the control between the left and right halves of the strip (in shared mode).
 # - Schedule operation hours with automatic shutdown outside of operating times.
 # - Monitor CPU temperature.
+# - Occupancy statistics (minutes per state, per half and per day).
+# - Power budget: frames that would draw too much current are shown dimmer.
+# - Settings live in busylight.conf and are reloaded automatically when the file changes.
+# - Can run with several uvicorn workers when the strip is driven by led_owner.py.
+# - Non-blocking JSON event log (state changes, LED update times, errors).
 #
 # Usage:
 # - Send POST requests to "/API/signal" to control the LED colors and intensity.
 # - Send POST requests to "/API/off" to turn off all or part of the LED strip.
 # - Use GET requests to "/API/temperature" to retrieve the current CPU temperature.
+# - Use GET requests to "/API/stats" to retrieve how long each half spent in each state.
+# - Use GET requests to "/API/power" to retrieve the estimated current of the LEDs.
 # API Doc:
 # http://API.IP...:5000/docs
 # http://API.IP...:5000/redoc
 # ---------------------------------------------------------------------------------------
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.openapi.utils import get_openapi
 from pydantic import BaseModel
 from typing import Optional
 import psutil  # Library for system monitoring
 from rpi_ws281x import Adafruit_NeoPixel, Color
-from datetime import datetime, time
+from datetime import date, datetime
+import os
+import asyncio
+import contextlib
+import hmac
 import threading
 import time as t
+import config
+from admission import AdmissionController, Overloaded
+from damping import COMMIT, HALVES, PENDING, UNCHANGED, FlapDamper
+from framebuffer import FramebufferStrip, OwnerUnavailable, SharedDampingStore
+from power import PowerGovernor
+from recorder import RecorderMiddleware, TraceWriter
+from logger import StructuredLogger, create_event_handler
+from profiler import ProfilerBusy, RouteTimingMiddleware, SamplingProfiler
+import stats
 
-# Configuration API
-DEFAULT_INTENSITY = 20  # Default intensity percentage (0-100)
-CONTROL_INTENSITY = True  # Set to False to ignore intensity settings from the API
 VERSION = '1.2.0'
 
-# Schedule configuration
-USE_SCHEDULE = True  # Set to True to enforce the schedule
-START_TIME = time(8, 0)  # Start time in the format (hour, minute)
-END_TIME = time(17, 0)   # End time in the format (hour, minute)
-WEEKDAYS = [0, 1, 2, 3, 4]  # Days of the week to apply the schedule (0 = Monday, 4 = Friday)
+# Configuration file (see busylight.conf). It is watched and reloaded without a restart.
+CONFIG_PATH = os.environ.get("BUSYLIGHT_CONFIG", config.DEFAULT_CONFIG_PATH)
+# Set by replay.py and load_simulator.py so their results do not depend on the time of day
+IGNORE_SCHEDULE = os.environ.get("BUSYLIGHT_IGNORE_SCHEDULE") == "1"
 
-# Orientation configuration
-INVERT_POSITION = False  # Set to True if the device is mounted upside-down
-
-#################################################################
-# Configuration values
-LED_COUNT = 32        # Number of LED pixels
-LED_PIN = 18          # GPIO pin connected to the pixels (must support PWM)
-LED_FREQ_HZ = 800000  # LED signal frequency in Hertz (usually 800kHz)
-LED_DMA = 10          # DMA channel to use for generating signal
-LED_BRIGHTNESS = 255  # Set to 0 for the darkest and 255 for the brightest
-LED_INVERT = False    # True to invert the signal (when using NPN transistor level shift)
+# Current settings snapshot. It is only ever replaced as a whole (see apply_settings).
+settings = config.load_settings(CONFIG_PATH)
 
 app = FastAPI()
 
+# JSON event log written by a background thread (see logger.py and the [logging] config section)
+logger = StructuredLogger(settings.logging_queue_size, create_event_handler(settings))
+
+# Trace of the control requests, only while [recorder] enabled = true (see recorder.py)
+def create_trace_writer(current):
+    if not current.recorder_enabled:
+        return None
+    return TraceWriter(current.recorder_path, current.recorder_max_bytes, current.recorder_backups)
+
+trace_writer = create_trace_writer(settings)
+app.add_middleware(RecorderMiddleware, get_writer=lambda: trace_writer)
+
+# On-demand sampling profiler for /API/admin/profile (no cost while it is not running)
+profiler = SamplingProfiler()
+app.add_middleware(RouteTimingMiddleware, profiler=profiler)
+
+# Serializes access to the strip between requests, the schedule thread and config reloads
+strip_lock = threading.Lock()
+
+# Wakes up the schedule checker early when the schedule configuration changes
+schedule_changed = threading.Event()
+
 # Create NeoPixel object with the appropriate configuration.
-strip = Adafruit_NeoPixel(LED_COUNT, LED_PIN, LED_FREQ_HZ, LED_DMA, LED_INVERT, LED_BRIGHTNESS)
+# With `owner = shared` the strip is driven by led_owner.py and we only write into its framebuffer.
+def create_strip(current):
+    if current.led_owner == "shared":
+        new_strip = FramebufferStrip(current.led_shared_memory, current.led_notify_path)
+    else:
+        new_strip = Adafruit_NeoPixel(current.led_count, current.led_pin, current.led_freq_hz,
+                                      current.led_dma, current.led_invert, current.led_brightness)
+    # Initialize the library (must be called once before other functions).
+    new_strip.begin()
+    return new_strip
+
+strip = create_strip(settings)
+
+# Keeps every frame within the [power] current budget (with `owner = shared` led_owner.py does it)
+governor = PowerGovernor(*settings.power)
+
+# Function to push the pixels to the strip, dimmed if needed to stay within the power budget.
+# Must be called with strip_lock held.
+def show_strip(current=None):
+    current = current or settings
+    if current.led_owner == "local":
+        brightness = governor.govern(strip.getPixels()[:current.led_count])
+        if brightness != strip.getBrightness():
+            strip.setBrightness(brightness)
+    strip.show()
 
-# Initialize the library (must be called once before other functions).
-strip.begin()
+# History of the state of each zone, used by /API/stats
+occupancy = stats.OccupancyStats(settings.stats_event_log_size, settings.stats_retention_days,
+                                 settings.stats_retention_months)
 
 # Data model for the signal
 class Signal(BaseModel):
     color: Optional[str] = None  # Color in the format "green", "red", "orange", or "off"
     half: Optional[str] = None  # "left", "right", or None for all
-    intensity: Optional[int] = DEFAULT_INTENSITY  # Intensity in percentage (0-100). Default is 100%
+    intensity: Optional[int] = None  # Intensity in percentage (0-100). Default is default_intensity from the config
 
     class Config:
         schema_extra = {
@@ -94,90 +149,265 @@ def get_temperature():
         return temp['cpu_thermal'][0].current
     return None
 
-# Function to get color based on a string
-def get_color(color_str: str, intensity: Optional[int] = DEFAULT_INTENSITY) -> Color:
-    colors = {
-        "green": Color(0, 255, 0),
-        "red": Color(255, 0, 0),
-        "orange": Color(255, 69, 0)
-    }
-    
-    if color_str.lower() not in colors:
+# Function to get color based on a string (looked up in the precomputed color table)
+def get_color(color_str: str, intensity: Optional[int] = None) -> Color:
+    current = settings
+    if intensity is None:
+        intensity = current.default_intensity
+
+    colors = current.color_table.get(color_str.lower())
+    if colors is None:
         raise HTTPException(status_code=400, detail="Unsupported color. Use 'green', 'red', or 'orange'.")
 
-    color = colors[color_str.lower()]
-    
     if intensity < 0 or intensity > 100:
         raise HTTPException(status_code=400, detail="Intensity must be between 0 and 100")
-    
-    # Adjust RGB values according to the intensity
-    factor = intensity / 100
-    red = int((color >> 16 & 0xFF) * factor)
-    green = int((color >> 8 & 0xFF) * factor)
-    blue = int((color & 0xFF) * factor)
-    
-    return Color(red, green, blue)
-
-# Function to set the color for the left half of the LED strip
-def set_left_square(color):
-    rows = 4  # Number of rows
-    cols = 8  # Number of columns
-    for row in range(rows):
-        for col in range(0, cols // 2):  # LEDs in columns 0 to 3
-            index = row * cols + col
-            strip.setPixelColor(index, color)
-    strip.show()
 
-# Function to set the color for the right half of the LED strip
-def set_right_square(color):
-    rows = 4  # Number of rows
-    cols = 8  # Number of columns
-    for row in range(rows):
-        for col in range(cols // 2, cols):  # LEDs in columns 4 to 7
-            index = row * cols + col
-            strip.setPixelColor(index, color)
-    strip.show()
+    return colors[intensity]
 
-# Function to set the color for all LEDs
-def set_all_square(color):
-    for i in range(LED_COUNT):
-        strip.setPixelColor(i, color)
-    strip.show()
+# Function to validate a half ("left", "right" or None for the entire strip)
+def validate_half(half: Optional[str], detail: str = "Unsupported half value"):
+    if half not in settings.zones:
+        raise HTTPException(status_code=400, detail=detail)
+
+# Function to record the new state of a half for /API/stats. Must be called with strip_lock held.
+# With `owner = shared` the state is written to the shared framebuffer with the pixels, and every
+# worker reads it back from there (see sync_occupancy).
+def record_state(current, half, state):
+    if current.led_owner == "shared":
+        strip.setZoneState(half, state)
+    else:
+        occupancy.record(half, state)
+
+# Function to replay the transitions written by all the workers into the local statistics
+def sync_occupancy():
+    if settings.led_owner != "shared":
+        return
+    with strip_lock:
+        start, transitions = strip.read_transitions()
+    if start is not None:
+        occupancy.rebase(start)
+    for timestamp, half, state in transitions:
+        occupancy.record(half, state, timestamp)
+
+# Function to set the color and state of a half ("left", "right" or None for the entire strip)
+def set_zone(half, color, state):
+    current = settings
+    with strip_lock:
+        for index in current.zones[half]:
+            strip.setPixelColor(index, color)
+        record_state(current, half, state)
+        show_strip(current)
+
+# Function to apply the writes merged by the admission controller: {half: (color, state)}.
+# Runs in a worker thread and updates the strip only once for all the halves.
+def apply_halves(batch):
+    current = settings
+    with strip_lock:
+        for half, (color, state) in batch.items():
+            for index in current.zones[half]:
+                strip.setPixelColor(index, color)
+            record_state(current, half, state)
+        start = t.perf_counter()
+        show_strip(current)
+        show_ms = (t.perf_counter() - start) * 1000
+    logger.log("leds_updated", halves={half or "all": state for half, (_, state) in batch.items()},
+               show_ms=round(show_ms, 3))
+
+# Bounded, merging queue in front of the LEDs for /API/signal and /API/off
+admission = AdmissionController(apply_halves, settings.admission_max_in_flight)
+
+# Per-half minimum dwell time and settling of new states (see the [damping] config section).
+# With `owner = shared` its state is shared by all the workers through the framebuffer.
+def create_damping_store(current):
+    return SharedDampingStore(lambda: strip) if current.led_owner == "shared" else None
+
+damper = FlapDamper(settings.damping_min_dwell, settings.damping_stable_for, store=create_damping_store(settings))
+
+# Function to run `function` (a damper operation) from the event loop. With a shared store
+# the damper takes the framebuffer lock, which another process may hold for a while: it
+# then runs in a worker thread so the event loop never blocks on it.
+async def run_damper(function):
+    if damper.store is None:
+        return function()
+    return await asyncio.to_thread(function)
+
+# Function to queue a write through the admission controller (429 when saturated).
+# Returns True if the write was replaced by a newer request for the same half.
+async def admit_write(half, value):
+    try:
+        return await admission.submit(half, value)
+    except Overloaded:
+        logger.log("request_rejected", "warning", half=half, reason="overloaded")
+        raise HTTPException(status_code=429, detail="Too many requests, try again later",
+                            headers={"Retry-After": str(settings.admission_retry_after)})
+    except OwnerUnavailable:
+        logger.log("request_rejected", "error", half=half, reason="owner_unavailable")
+        raise HTTPException(status_code=503, detail="The LED owner process is not running")
+
+# Function to commit a pending transition once it has been stable long enough
+async def commit_pending(half, token):
+    try:
+        if not is_within_schedule():
+            # The schedule turned the LEDs off: a change requested just before the end of the
+            # operating hours must not turn them on again
+            if await run_damper(lambda: damper.drop(half, token)):
+                logger.log("pending_dropped", "info", half=half, reason="outside_schedule")
+            return
+        value = await run_damper(lambda: damper.take_due(half, token))
+        if value is None:
+            return  # Replaced or cancelled by a newer request (possibly in another worker)
+        await admission.submit(half, value, bypass_limit=True)
+    except OwnerUnavailable:
+        logger.log("pending_dropped", "error", half=half, reason="owner_unavailable")
+        with contextlib.suppress(OwnerUnavailable):
+            await run_damper(lambda: damper.invalidate((half,)))
+
+# Function to write a color to a half, through the flap damper when it is enabled.
+# Returns a note for the response message ("" if the LEDs were simply updated).
+async def submit_write(half, color, state):
+    value = (color, state)
+    if not damper.enabled:
+        return " (replaced by a newer request)" if await admit_write(half, value) else ""
+
+    try:
+        halves = HALVES if half is None else (half,)
+        decisions = await run_damper(lambda: {h: damper.request(h, value) for h in halves})
+    except OwnerUnavailable:
+        logger.log("request_rejected", "error", half=half, reason="owner_unavailable")
+        raise HTTPException(status_code=503, detail="The LED owner process is not running")
+    commit = tuple(h for h, (decision, _) in decisions.items() if decision == COMMIT)
+    replaced = False
+    if commit:
+        try:
+            replaced = await admit_write(None if len(commit) == len(HALVES) else commit[0], value)
+        except HTTPException:
+            with contextlib.suppress(OwnerUnavailable):
+                await run_damper(lambda: damper.invalidate(commit))
+            raise
+
+    loop = asyncio.get_running_loop()
+    now = t.monotonic()
+    waits = []
+    for h, (decision, info) in decisions.items():
+        if decision == PENDING:
+            due, token, new = info
+            delay = max(0.0, due - now)
+            if new:
+                loop.call_later(delay, lambda h=h, token=token: asyncio.ensure_future(commit_pending(h, token)))
+            waits.append(delay)
+
+    if replaced:
+        return " (replaced by a newer request)"
+    if waits:
+        return f" (pending: applied in {max(waits):.1f}s if not changed before)"
+    if all(decision == UNCHANGED for decision, _ in decisions.values()):
+        return " (already shown)"
+    return ""
 
 # Function to turn off all LEDs
 def turn_off_leds():
-    set_all_square(Color(0, 0, 0))  # Set all LEDs to black/off
+    set_zone(None, Color(0, 0, 0), "off")  # Set all LEDs to black/off
+
+# Function to apply a new settings snapshot without restarting the service
+def apply_settings(new_settings):
+    global settings, strip, trace_writer
+    with strip_lock:
+        old_settings = settings
+        if new_settings.hardware != old_settings.hardware or new_settings.backend != old_settings.backend:
+            local = old_settings.led_owner == new_settings.led_owner == "local"
+            # The strip must be recreated: keep what is currently shown on it
+            # (the shared framebuffer keeps it by itself)
+            pixels = [strip.getPixelColor(i) for i in range(old_settings.led_count)] if local else []
+
+            def restore(current):
+                if local:
+                    for i, color in enumerate(pixels[:current.led_count]):
+                        strip.setPixelColor(i, color)
+                    show_strip(current)
+
+            strip._cleanup()
+            try:
+                strip = create_strip(new_settings)
+            except Exception:
+                # Invalid hardware values (pin, dma...): go back to the previous strip and
+                # settings. The config watcher reports the error.
+                strip = create_strip(old_settings)
+                restore(old_settings)
+                raise
+            governor.configure(*new_settings.power)
+            restore(new_settings)
+        elif new_settings.power != old_settings.power:
+            governor.configure(*new_settings.power)
+            show_strip(new_settings)
+        settings = new_settings
+    admission.max_in_flight = new_settings.admission_max_in_flight
+    if new_settings.led_owner != old_settings.led_owner:
+        damper.store = create_damping_store(new_settings)
+    with contextlib.suppress(OwnerUnavailable):
+        damper.configure(new_settings.damping_min_dwell, new_settings.damping_stable_for)
+    recorder_keys = ("recorder_enabled", "recorder_path", "recorder_max_bytes", "recorder_backups")
+    if any(getattr(new_settings, key) != getattr(old_settings, key) for key in recorder_keys):
+        old_writer, trace_writer = trace_writer, create_trace_writer(new_settings)
+        if old_writer is not None:
+            old_writer.close()
+    logging_keys = ("logging_path", "logging_max_bytes", "logging_backups")
+    changed = any(getattr(new_settings, key) != getattr(old_settings, key) for key in logging_keys)
+    logger.configure(new_settings.logging_queue_size,
+                     create_event_handler(new_settings) if changed else logger.file_handler)
+    occupancy.configure(new_settings.stats_event_log_size, new_settings.stats_retention_days,
+                        new_settings.stats_retention_months)
+    schedule_changed.set()
+    logger.log("config_reloaded", path=CONFIG_PATH)
 
 # Function to check if the current time is within the allowed schedule
 def is_within_schedule():
-    if not USE_SCHEDULE:
+    current = settings
+    if IGNORE_SCHEDULE or not current.use_schedule:
         return True  # If schedule enforcement is disabled, always return True
 
     now = datetime.now()
     current_time = now.time()
     current_day = now.weekday()
-    
+
     # Check if today is within the allowed weekdays and the current time is within the allowed range
-    return current_day in WEEKDAYS and START_TIME <= current_time <= END_TIME
+    return current_day in current.weekdays and current.start_time <= current_time <= current.end_time
 
-# Background thread function to check schedule every minute
+# Background thread function to check schedule every minute (or right after a config reload)
 def schedule_checker():
+    within = None
     while True:
-        if not is_within_schedule():
-            turn_off_leds()
-        t.sleep(60)  # Check every minute
+        current = is_within_schedule()
+        if current != within:
+            within = current
+            logger.log("schedule_changed", within_schedule=within)
+        if not within:
+            try:
+                turn_off_leds()
+                damper.reset()
+            except OwnerUnavailable:
+                pass  # Nothing to turn off until led_owner.py is running
+        try:
+            sync_occupancy()  # Keep up with the shared transition log even without /API/stats requests
+        except OwnerUnavailable:
+            pass
+        schedule_changed.wait(60)  # Check every minute
+        schedule_changed.clear()
 
 # Start the schedule checker thread
-threading.Thread(target=schedule_checker, daemon=True).start()
+threading.Thread(target=schedule_checker, daemon=True, name="schedule-checker").start()
+
+# Watch the config file and apply the changes live
+config.ConfigWatcher(CONFIG_PATH, apply_settings,
+                     on_error=lambda message: logger.log("config_error", "error", message=message)).start()
 
 # Route to receive signals and control LEDs
 @app.post("/API/signal", summary="Control the LED strip", description="""
 Controls an LED strip based on the received signal. You can specify the color, the half of the strip to illuminate, and the intensity of the color.
 
 - **color**: The color to set. Supported values are 'green', 'red', 'orange', or 'off' to turn off LEDs.
-- **half**: Which half of the strip to illuminate or turn off. Options are 'left', 'right', or None for the entire strip. Note that 'left' and 'right' are based on the orientation of the device. If the USB charging port is facing downwards, 'left' will illuminate the left half from that perspective. If the device is mounted upside-down, set the `INVERT_POSITION` variable to `True` to reverse these sides.
+- **half**: Which half of the strip to illuminate or turn off. Options are 'left', 'right', or None for the entire strip. Note that 'left' and 'right' are based on the orientation of the device. If the USB charging port is facing downwards, 'left' will illuminate the left half from that perspective. If the device is mounted upside-down, set `invert_position = true` in the config file to reverse these sides.
 - **intensity**: (Optional) The intensity of the color, in percentage (0-100). Default is 100%. 
-  - **Note**: If the server is configured to ignore intensity changes (`CONTROL_INTENSITY` is False), the specified intensity will be ignored, and the default intensity will be used.
+  - **Note**: If the server is configured to ignore intensity changes (`control_intensity = false` in the config file), the specified intensity will be ignored, and the default intensity will be used.
 
 **Examples**:
 1. To illuminate the left half with green color and 75% intensity (with USB charging port facing downwards):
@@ -213,43 +443,25 @@ async def receive_signal(signal: Signal):
     if not is_within_schedule():
         raise HTTPException(status_code=403, detail="Outside of operating hours")
 
+    current = settings
+    # If the server ignores intensity settings (control_intensity = false), use the default intensity
+    if current.control_intensity and signal.intensity is not None:
+        intensity = signal.intensity
+    else:
+        intensity = current.default_intensity
+
     if signal.color and signal.color.lower() == "off":
-        if signal.half == "left":
-            set_left_square(Color(0, 0, 0))
-        elif signal.half == "right":
-            set_right_square(Color(0, 0, 0))
-        elif signal.half is None:  # If "half" is not specified, turn off the entire strip
-            turn_off_leds()
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported half value for 'off'")
+        # If "half" is not specified, turn off the entire strip
+        validate_half(signal.half, "Unsupported half value for 'off'")
+        note = await submit_write(signal.half, Color(0, 0, 0), "off")
     else:
-        if not CONTROL_INTENSITY:
-            # Inform client that intensity control is disabled and use default intensity
-            color = get_color(signal.color, DEFAULT_INTENSITY)
-        else:
-            color = get_color(signal.color, signal.intensity)
-        
-        # Adjust for inverted position
-        if INVERT_POSITION:
-            if signal.half == "left":
-                set_right_square(color)
-            elif signal.half == "right":
-                set_left_square(color)
-            elif signal.half is None:  # If "half" is not specified, illuminate the entire strip
-                set_all_square(color)
-            else:
-                raise HTTPException(status_code=400, detail="Unsupported half value")
-        else:
-            if signal.half == "left":
-                set_left_square(color)
-            elif signal.half == "right":
-                set_right_square(color)
-            elif signal.half is None:  # If "half" is not specified, illuminate the entire strip
-                set_all_square(color)
-            else:
-                raise HTTPException(status_code=400, detail="Unsupported half value")
-    
-    return {"status": "success", "message": f"LEDs {signal.half or 'all'} set to {signal.color} with {signal.intensity if CONTROL_INTENSITY else DEFAULT_INTENSITY}% intensity"}
+        color = get_color(signal.color, intensity)
+
+        # If "half" is not specified, illuminate the entire strip
+        validate_half(signal.half)
+        note = await submit_write(signal.half, color, signal.color.lower())
+
+    return {"status": "success", "message": f"LEDs {signal.half or 'all'} set to {signal.color} with {intensity}% intensity{note}"}
 
 # Route to get the current temperature
 @app.get("/API/temperature", summary="Get current CPU temperature", description="""
@@ -300,22 +512,124 @@ async def turn_off(request: OffRequest):
     if not is_within_schedule():
         raise HTTPException(status_code=403, detail="Outside of operating hours")
     
-    # Switches off only the left half
-    if request.half == "left":
-        set_left_square(Color(0, 0, 0))  # Apaga LEDs de la izquierda
+    # Switches off the left half, the right half or all LEDs if no half is specified
+    validate_half(request.half, "Unsupported half value for 'off'")
+    note = await submit_write(request.half, Color(0, 0, 0), "off")
 
-    # Switches off only the right half
-    elif request.half == "right":
-        set_right_square(Color(0, 0, 0))  # Apaga LEDs de la derecha
+    return {"status": "success", "message": f"LEDs {request.half or 'all'} turned off{note}"}
 
-    # Turns off all LEDs if no half is specified.
-    elif request.half is None:
-        turn_off_leds()  # Turns off all LEDs
+# Route to get occupancy statistics
+@app.get("/API/stats", summary="Get occupancy statistics", description="""
+Returns how many minutes each half of the strip spent in each state (off, green, red, orange) between two dates.
 
-    else:
-        raise HTTPException(status_code=400, detail="Unsupported half value for 'off'")
+- **start**: (Optional) First day to include, in the format YYYY-MM-DD. Default is 6 days before `end`.
+- **end**: (Optional) Last day to include, in the format YYYY-MM-DD. Default is today.
+- **half**: (Optional) 'left' or 'right'. Default is both halves.
+
+The answer is built from daily totals kept in memory. Days older than `retention_days` (see the config file) are only
+available as monthly totals, which are returned in `months` for every month whose downsampled days overlap the
+requested range. `total` only includes the months whose downsampled days are all inside the range (`in_total`);
+the others are listed for reference but left out of `total`, so it never counts time outside the range.
+`damping` reports the flap damping settings, the number of suppressed transitions per half and the seconds left
+for any pending transition. `logging` reports the records queued, written and dropped by the event log.
+
+Example:
+/API/stats?start=2024-09-02&end=2024-09-06&half=left
+""")
+async def get_stats(start: Optional[date] = None, end: Optional[date] = None, half: Optional[str] = None):
+    if end is None:
+        end = date.today()
+    if start is None:
+        start = date.fromordinal(max(1, end.toordinal() - 6))
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be earlier than or equal to end")
+    if half is not None and half not in stats.ZONES:
+        raise HTTPException(status_code=400, detail="Unsupported half value")
+
+    try:
+        await asyncio.to_thread(sync_occupancy)
+    except OwnerUnavailable:
+        pass  # Answer with the transitions read so far
+    result = occupancy.query(start, end, half)
+    result["current"] = occupancy.current()
+    result["events"] = {"stored": len(occupancy.events), "capacity": occupancy.events.capacity}
+    try:
+        result["damping"] = await run_damper(damper.status)
+    except OwnerUnavailable:
+        result["damping"] = None
+    result["logging"] = logger.status()
+    writer = trace_writer
+    result["recorder"] = {"dropped": writer.dropped} if writer is not None else None
+    return result
+
+# Route to get the power estimate of the LEDs
+@app.get("/API/power", summary="Get the estimated LED current", description="""
+Returns the current drawn by the frame on the strip, estimated from its colors, and whether it had to be dimmed to stay
+within the `budget_ma` of the [power] section of the config file (0 = no limit).
+
+- **estimate_ma**: Current the frame would draw at the configured brightness.
+- **limited_ma**: Current at the brightness actually used.
+- **brightness**: Brightness used for the frame (lower than `configured_brightness` when limited).
+- **limited_frames**: Number of frames dimmed since the start of the service.
+
+With `owner = shared` the values come from led_owner.py; a 503 error is returned if it is not running.
 
-    return {"status": "success", "message": f"LEDs {request.half or 'all'} turned off"}
+Example:
+{ "budget_ma": 1000, "estimate_ma": 1344.0, "limited_ma": 996.1, "limited": true, "brightness": 188,
+  "configured_brightness": 255, "limited_frames": 3 }
+""")
+async def get_power():
+    if settings.led_owner == "local":
+        return governor.status()
+    try:
+        return strip.power_status()
+    except OwnerUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+# Function to check the token of the admin endpoints
+def check_admin_token(token: Optional[str]):
+    expected = settings.admin_token
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (set [admin] token in the config file)")
+    if token is None or not hmac.compare_digest(token.encode(), expected.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+# Route to profile the live service
+@app.post("/API/admin/profile", summary="Profile the running service", description="""
+Runs a sampling profiler for a number of seconds across all the threads of the service (event loop, schedule
+checker, config watcher and LED worker threads) and returns where the time was spent, plus the timing of every
+route requested during that window. Requires the `X-Admin-Token` header (see the [admin] section of the config file).
+
+- **seconds**: Duration of the profiling window (0-60). Default is 10.
+- **interval_ms**: Time between samples in milliseconds (1-100). Default is 5.
+- **format**: 'json' (default) for a summary with the collapsed stacks, or 'collapsed' for the collapsed stacks
+  only, as plain text that flame graph tools (flamegraph.pl, speedscope) can read.
+
+Example:
+curl -X POST -H "X-Admin-Token: ..." "http://API.IP...:5000/API/admin/profile?seconds=30&format=collapsed"
+""")
+async def profile(seconds: float = 10, interval_ms: float = 5, format: str = "json",
+                  x_admin_token: Optional[str] = Header(None)):
+    check_admin_token(x_admin_token)
+    if seconds <= 0 or seconds > 60:
+        raise HTTPException(status_code=400, detail="seconds must be between 0 and 60")
+    if interval_ms < 1 or interval_ms > 100:
+        raise HTTPException(status_code=400, detail="interval_ms must be between 1 and 100")
+    if format not in ("json", "collapsed"):
+        raise HTTPException(status_code=400, detail="Unsupported format. Use 'json' or 'collapsed'.")
+
+    try:
+        profiler.start(interval_ms / 1000)
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profiling session is already running")
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        result = profiler.stop()
+
+    if format == "collapsed":
+        return PlainTextResponse(result["collapsed"] + "\n")
+    return result
 
 # Customize the OpenAPI schema
 def custom_openapi():
@@ -0,0 +1,84 @@
+# ---------------------------------------------------------------------------------------
+# Project: BusyLight API - Admission control
+# Author: Evaristo R. Rivieccio Vega - SysAdmin
+# GitHub: https://github.com/evaristorivi
+# LinkedIn: https://www.linkedin.com/in/evaristorivieccio/
+# Web: https://www.evaristorivieccio.es/
+# ---------------------------------------------------------------------------------------
+# Description:
+# Protects the LED path when many clients send requests at the same time (for example,
+# every laptop in the office waking up at 9:00).
+#
+# - Requests are not applied one by one. Each request only updates the desired state of
+#   its halves ("left", "right"), and a single writer applies all pending halves with one
+#   strip update, off the event loop. If several requests for the same half arrive while
+#   the writer is busy, only the newest one is written; the others are merged into it.
+# - The number of requests admitted and not yet answered is bounded. When the limit is
+#   reached, new requests are rejected at once (Overloaded, returned as 429 by the API)
+#   instead of piling up.
+# ---------------------------------------------------------------------------------------
+
+import asyncio
+import itertools
+
+HALVES = ("left", "right")
+
+
+class Overloaded(Exception):
+    pass
+
+
+class AdmissionController:
+    # `apply` is called in a worker thread with a dict {half: value} of pending writes
+    def __init__(self, apply, max_in_flight=64):
+        self.apply = apply
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.pending = {}   # half -> (value, request id)
+        self.waiters = []   # (future, halves, request id)
+        self.writer = None
+        self.ids = itertools.count()
+        self.rejected = 0
+        self.merged = 0
+
+    # Queue a write for `half` ("left", "right" or None for both) and wait until it has been
+    # applied. Returns True if the write was replaced by a newer request for the same half.
+    # `bypass_limit` is for internal writes that must not be shed (deferred commits).
+    async def submit(self, half, value, bypass_limit=False):
+        if self.in_flight >= self.max_in_flight and not bypass_limit:
+            self.rejected += 1
+            raise Overloaded()
+
+        halves = HALVES if half is None else (half,)
+        request_id = next(self.ids)
+        for h in halves:
+            if h in self.pending:
+                self.merged += 1
+            self.pending[h] = (value, request_id)
+
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append((future, halves, request_id))
+        self.in_flight += 1
+        if self.writer is None or self.writer.done():
+            self.writer = asyncio.ensure_future(self._drain())
+        try:
+            applied = await future
+        finally:
+            self.in_flight -= 1
+        return any(applied[h] != request_id for h in halves)
+
+    async def _drain(self):
+        while self.pending:
+            batch, self.pending = self.pending, {}
+            waiters, self.waiters = self.waiters, []
+            try:
+                await asyncio.to_thread(self.apply, {h: value for h, (value, _) in batch.items()})
+            except Exception as e:
+                for future, _, _ in waiters:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            applied = {h: request_id for h, (_, request_id) in batch.items()}
+            for future, _, _ in waiters:
+                if not future.done():
+                    future.set_result(applied)
@@ -0,0 +1,386 @@
+# ---------------------------------------------------------------------------------------
+# Project: BusyLight API - Configuration
+# Author: Evaristo R. Rivieccio Vega - SysAdmin
+# GitHub: https://github.com/evaristorivi
+# LinkedIn: https://www.linkedin.com/in/evaristorivieccio/
+# Web: https://www.evaristorivieccio.es/
+# ---------------------------------------------------------------------------------------
+# Description:
+# Loads the BusyLight API settings from an INI file (busylight.conf by default) and
+# watches that file with inotify so changes are applied without restarting the service.
+#
+# Every load builds a complete, validated Settings snapshot, including the derived
+# tables the API uses on each request (LED indices per zone and a color lookup table
+# per intensity). The API swaps the whole snapshot in a single assignment, so a request
+# never sees half of an old configuration and half of a new one. If the edited file is
+# invalid, the error is reported and the previous settings stay in use.
+#
+# The config file path can be overridden with the BUSYLIGHT_CONFIG environment variable.
+# ---------------------------------------------------------------------------------------
+
+import configparser
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time as t
+from datetime import time
+from rpi_ws281x import Color
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "busylight.conf")
+
+# Base colors at 100% intensity (red, green, blue)
+BASE_COLORS = {
+    "green": (0, 255, 0),
+    "red": (255, 0, 0),
+    "orange": (255, 69, 0),
+}
+
+# Values used when a key is missing from the config file (same as the original constants)
+DEFAULTS = {
+    "api": {
+        "default_intensity": "20",
+        "control_intensity": "true",
+    },
+    "schedule": {
+        "use_schedule": "true",
+        "start_time": "08:00",
+        "end_time": "17:00",
+        "weekdays": "0,1,2,3,4",
+    },
+    "orientation": {
+        "invert_position": "false",
+    },
+    "led": {
+        "count": "32",
+        "columns": "8",
+        "pin": "18",
+        "freq_hz": "800000",
+        "dma": "10",
+        "brightness": "255",
+        "invert": "false",
+        "owner": "local",
+        "shared_memory": "busylight",
+        "notify_path": "/run/busylight/notify",
+    },
+    "power": {
+        "budget_ma": "1000",
+        "red_ma": "20",
+        "green_ma": "20",
+        "blue_ma": "20",
+        "idle_ma": "1",
+    },
+    "admission": {
+        "max_in_flight": "64",
+        "retry_after": "2",
+    },
+    "damping": {
+        "min_dwell": "0",
+        "stable_for": "0",
+    },
+    "recorder": {
+        "enabled": "false",
+        "path": "traces/requests.jsonl",
+        "max_bytes": "5000000",
+        "backups": "3",
+    },
+    "logging": {
+        "path": "logs/events.jsonl",
+        "max_bytes": "5000000",
+        "backups": "3",
+        "queue_size": "10000",
+    },
+    "admin": {
+        "token": "",
+    },
+    "stats": {
+        "event_log_size": "4096",
+        "retention_days": "90",
+        "retention_months": "24",
+    },
+}
+
+
+class ConfigError(ValueError):
+    pass
+
+
+# Immutable snapshot of the configuration plus the tables derived from it
+class Settings:
+    __slots__ = (
+        "default_intensity", "control_intensity",
+        "use_schedule", "start_time", "end_time", "weekdays",
+        "invert_position",
+        "led_count", "led_columns", "led_pin", "led_freq_hz", "led_dma", "led_brightness", "led_invert",
+        "led_owner", "led_shared_memory", "led_notify_path",
+        "power_budget_ma", "power_red_ma", "power_green_ma", "power_blue_ma", "power_idle_ma",
+        "admission_max_in_flight", "admission_retry_after",
+        "damping_min_dwell", "damping_stable_for",
+        "recorder_enabled", "recorder_path", "recorder_max_bytes", "recorder_backups",
+        "logging_path", "logging_max_bytes", "logging_backups", "logging_queue_size",
+        "admin_token",
+        "stats_event_log_size", "stats_retention_days", "stats_retention_months",
+        "zones", "color_table",
+    )
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            object.__setattr__(self, name, values[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Settings are read-only, load a new snapshot instead")
+
+    # Values passed to Adafruit_NeoPixel; if any of them changes the strip must be recreated
+    @property
+    def hardware(self):
+        return (self.led_count, self.led_pin, self.led_freq_hz, self.led_dma, self.led_invert)
+
+    # Arguments of PowerGovernor (see power.py)
+    @property
+    def power(self):
+        return (self.power_budget_ma, self.power_red_ma, self.power_green_ma, self.power_blue_ma,
+                self.power_idle_ma, self.led_brightness)
+
+    # Who drives the strip and how the API reaches it (see framebuffer.py)
+    @property
+    def backend(self):
+        return (self.led_owner, self.led_shared_memory, self.led_notify_path)
+
+
+def _parse_int(parser, section, key, low, high):
+    try:
+        value = parser.getint(section, key)
+    except ValueError:
+        raise ConfigError(f"[{section}] {key} must be an integer")
+    if value < low or value > high:
+        raise ConfigError(f"[{section}] {key} must be between {low} and {high}")
+    return value
+
+
+def _parse_float(parser, section, key, low, high):
+    try:
+        value = parser.getfloat(section, key)
+    except ValueError:
+        raise ConfigError(f"[{section}] {key} must be a number")
+    if value < low or value > high:
+        raise ConfigError(f"[{section}] {key} must be between {low} and {high}")
+    return value
+
+
+def _parse_bool(parser, section, key):
+    try:
+        return parser.getboolean(section, key)
+    except ValueError:
+        raise ConfigError(f"[{section}] {key} must be true or false")
+
+
+def _parse_choice(parser, section, key, choices):
+    value = parser.get(section, key).strip().lower()
+    if value not in choices:
+        raise ConfigError(f"[{section}] {key} must be one of: {', '.join(choices)}")
+    return value
+
+
+def _parse_time(parser, section, key):
+    raw = parser.get(section, key).strip()
+    try:
+        hour, minute = raw.split(":")
+        return time(int(hour), int(minute))
+    except ValueError:
+        raise ConfigError(f"[{section}] {key} must use the HH:MM format")
+
+
+def _parse_weekdays(parser, section, key):
+    raw = parser.get(section, key)
+    try:
+        days = frozenset(int(day) for day in raw.split(",") if day.strip())
+    except ValueError:
+        raise ConfigError(f"[{section}] {key} must be a comma separated list of numbers")
+    if any(day < 0 or day > 6 for day in days):
+        raise ConfigError(f"[{section}] {key} values must be between 0 (Monday) and 6 (Sunday)")
+    return days
+
+
+# Relative paths are relative to the directory of the config file. Empty stays empty.
+def _parse_path(config_path, parser, section, key):
+    raw = parser.get(section, key).strip()
+    if not raw:
+        return ""
+    return os.path.join(os.path.dirname(os.path.abspath(config_path)), os.path.expanduser(raw))
+
+
+# LED indices of each zone. The strip is a matrix of `columns` LEDs per row, left half first.
+def build_zones(led_count, columns, invert_position):
+    rows = led_count // columns
+    left = tuple(row * columns + col for row in range(rows) for col in range(0, columns // 2))
+    right = tuple(row * columns + col for row in range(rows) for col in range(columns // 2, columns))
+    if invert_position:
+        left, right = right, left
+    return {"left": left, "right": right, None: tuple(range(led_count))}
+
+
+# Color value for every supported color and every intensity from 0 to 100
+def build_color_table():
+    table = {}
+    for name, (red, green, blue) in BASE_COLORS.items():
+        table[name] = tuple(
+            Color(int(red * intensity / 100), int(green * intensity / 100), int(blue * intensity / 100))
+            for intensity in range(101)
+        )
+    return table
+
+
+# Parse and validate the config file. Raises ConfigError if anything is wrong.
+def load_settings(path=DEFAULT_CONFIG_PATH):
+    parser = configparser.ConfigParser()
+    parser.read_dict(DEFAULTS)
+    try:
+        with open(path) as config_file:
+            parser.read_file(config_file)
+    except FileNotFoundError:
+        pass  # Missing file: run with the defaults
+    except (OSError, configparser.Error) as e:
+        raise ConfigError(f"Unable to read {path}: {e}")
+
+    values = {
+        "default_intensity": _parse_int(parser, "api", "default_intensity", 0, 100),
+        "control_intensity": _parse_bool(parser, "api", "control_intensity"),
+        "use_schedule": _parse_bool(parser, "schedule", "use_schedule"),
+        "start_time": _parse_time(parser, "schedule", "start_time"),
+        "end_time": _parse_time(parser, "schedule", "end_time"),
+        "weekdays": _parse_weekdays(parser, "schedule", "weekdays"),
+        "invert_position": _parse_bool(parser, "orientation", "invert_position"),
+        "led_count": _parse_int(parser, "led", "count", 1, 1024),
+        "led_columns": _parse_int(parser, "led", "columns", 2, 1024),
+        "led_pin": _parse_int(parser, "led", "pin", 0, 53),
+        "led_freq_hz": _parse_int(parser, "led", "freq_hz", 400000, 800000),
+        "led_dma": _parse_int(parser, "led", "dma", 0, 14),
+        "led_brightness": _parse_int(parser, "led", "brightness", 0, 255),
+        "led_invert": _parse_bool(parser, "led", "invert"),
+        "led_owner": _parse_choice(parser, "led", "owner", ("local", "shared")),
+        "led_shared_memory": parser.get("led", "shared_memory").strip(),
+        "led_notify_path": parser.get("led", "notify_path").strip(),
+        "power_budget_ma": _parse_float(parser, "power", "budget_ma", 0, 100000),
+        "power_red_ma": _parse_float(parser, "power", "red_ma", 0, 1000),
+        "power_green_ma": _parse_float(parser, "power", "green_ma", 0, 1000),
+        "power_blue_ma": _parse_float(parser, "power", "blue_ma", 0, 1000),
+        "power_idle_ma": _parse_float(parser, "power", "idle_ma", 0, 1000),
+        "admission_max_in_flight": _parse_int(parser, "admission", "max_in_flight", 1, 100000),
+        "admission_retry_after": _parse_int(parser, "admission", "retry_after", 1, 3600),
+        "damping_min_dwell": _parse_float(parser, "damping", "min_dwell", 0, 3600),
+        "damping_stable_for": _parse_float(parser, "damping", "stable_for", 0, 3600),
+        "recorder_enabled": _parse_bool(parser, "recorder", "enabled"),
+        "recorder_path": _parse_path(path, parser, "recorder", "path"),
+        "recorder_max_bytes": _parse_int(parser, "recorder", "max_bytes", 4096, 2 ** 31),
+        "recorder_backups": _parse_int(parser, "recorder", "backups", 0, 100),
+        "logging_path": _parse_path(path, parser, "logging", "path"),
+        "logging_max_bytes": _parse_int(parser, "logging", "max_bytes", 4096, 2 ** 31),
+        "logging_backups": _parse_int(parser, "logging", "backups", 0, 100),
+        "logging_queue_size": _parse_int(parser, "logging", "queue_size", 16, 1000000),
+        "admin_token": parser.get("admin", "token").strip(),
+        "stats_event_log_size": _parse_int(parser, "stats", "event_log_size", 16, 1000000),
+        "stats_retention_days": _parse_int(parser, "stats", "retention_days", 1, 3660),
+        "stats_retention_months": _parse_int(parser, "stats", "retention_months", 0, 1200),
+    }
+
+    if values["start_time"] > values["end_time"]:
+        raise ConfigError("[schedule] start_time must be earlier than end_time")
+    if values["led_count"] % values["led_columns"] != 0:
+        raise ConfigError("[led] count must be a multiple of [led] columns")
+
+    values["zones"] = build_zones(values["led_count"], values["led_columns"], values["invert_position"])
+    values["color_table"] = build_color_table()
+    return Settings(**values)
+
+
+# inotify constants (see inotify(7))
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def _inotify_init(directory):
+    libc_name = ctypes.util.find_library("c")
+    if libc_name is None:
+        return None
+    try:
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        fd = libc.inotify_init1(IN_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    # Watch the directory, not the file: editors usually save by writing a new file and renaming it
+    if libc.inotify_add_watch(fd, directory.encode(), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _events_touch(buffer, filename):
+    offset = 0
+    while offset + EVENT_HEADER.size <= len(buffer):
+        _, _, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+        offset += EVENT_HEADER.size
+        name = buffer[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+        offset += length
+        if name == filename:
+            return True
+    return False
+
+
+# Background thread that reloads the config file when it changes and passes every valid
+# snapshot to `on_change`. Falls back to polling the modification time without inotify.
+class ConfigWatcher(threading.Thread):
+    def __init__(self, path, on_change, on_error=print, debounce=0.2, poll_interval=5):
+        super().__init__(daemon=True, name="config-watcher")
+        self.path = os.path.abspath(path)
+        self.on_change = on_change
+        self.on_error = on_error
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+
+    def reload(self):
+        try:
+            settings = load_settings(self.path)
+        except ConfigError as e:
+            self.on_error(f"Invalid configuration, keeping the previous settings: {e}")
+            return
+        # An error while applying the settings must not stop the watcher
+        try:
+            self.on_change(settings)
+        except Exception as e:
+            self.on_error(f"Unable to apply the configuration, keeping the previous settings: {e!r}")
+
+    def run(self):
+        directory, filename = os.path.split(self.path)
+        fd = _inotify_init(directory)
+        if fd is None:
+            self._poll()
+            return
+        while True:
+            if not _events_touch(os.read(fd, 4096), filename):
+                continue
+            # Coalesce the burst of events produced by a single save
+            while select.select([fd], [], [], self.debounce)[0]:
+                os.read(fd, 4096)
+            self.reload()
+
+    def _poll(self):
+        last = self._mtime()
+        while True:
+            t.sleep(self.poll_interval)
+            current = self._mtime()
+            if current != last:
+                last = current
+                self.reload()
+
+    def _mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
@@ -0,0 +1,160 @@
+# ---------------------------------------------------------------------------------------
+# Project: BusyLight API - Flap damping
+# Author: Evaristo R. Rivieccio Vega - SysAdmin
+# GitHub: https://github.com/evaristorivi
+# LinkedIn: https://www.linkedin.com/in/evaristorivieccio/
+# Web: https://www.evaristorivieccio.es/
+# ---------------------------------------------------------------------------------------
+# Description:
+# Per-half hysteresis so short microphone sessions (notification sounds, device probing)
+# do not make the light flicker red/green.
+#
+# - min_dwell: a committed state is shown for at least this many seconds before it can
+#   change again.
+# - stable_for: a new state is only committed after it has been requested and not
+#   changed for this many seconds.
+#
+# While a change waits, it is a "pending transition". A newer request for the same half
+# replaces it, and a request back to the committed state cancels it; in both cases the
+# dropped transition is counted as suppressed and never reaches the LEDs.
+#
+# With several workers (`owner = shared`) the state lives in the shared framebuffer (the
+# `store`) and is loaded and saved under its lock around every operation, so a request
+# served by any worker sees what the others committed or left pending.
+# ---------------------------------------------------------------------------------------
+
+import threading
+import time as t
+from contextlib import contextmanager
+
+HALVES = ("left", "right")
+
+# Results of FlapDamper.request()
+COMMIT = "commit"
+PENDING = "pending"
+UNCHANGED = "unchanged"
+
+
+# `store` (optional) shares the state between processes: it provides locked() (a context
+# manager), load() returning the snapshot written by save(snapshot), or None if empty.
+# The clock must be the same for all of them (time.monotonic is system-wide on Linux).
+class FlapDamper:
+    def __init__(self, min_dwell=0, stable_for=0, clock=t.monotonic, store=None):
+        self.lock = threading.Lock()
+        self.clock = clock
+        self.store = store
+        self.min_dwell = min_dwell
+        self.stable_for = stable_for
+        self.committed = dict.fromkeys(HALVES)                  # half -> value shown
+        self.committed_at = dict.fromkeys(HALVES, float("-inf"))
+        self.pending = dict.fromkeys(HALVES)                    # half -> (value, due, token)
+        self.suppressed = dict.fromkeys(HALVES, 0)
+        self.next_token = 1
+
+    # Exclusive access to the state, loaded from and saved to the store if there is one
+    @contextmanager
+    def _locked(self):
+        with self.lock:
+            store = self.store
+            if store is None:
+                yield
+                return
+            with store.locked():
+                snapshot = store.load()
+                if snapshot is not None:
+                    (self.committed, self.committed_at, self.pending, self.suppressed,
+                     self.next_token) = snapshot
+                yield
+                store.save((self.committed, self.committed_at, self.pending, self.suppressed,
+                            self.next_token))
+
+    @property
+    def enabled(self):
+        return self.min_dwell > 0 or self.stable_for > 0
+
+    def configure(self, min_dwell, stable_for):
+        with self.lock:
+            was_enabled = self.enabled
+            self.min_dwell = min_dwell
+            self.stable_for = stable_for
+        if not was_enabled:
+            self.invalidate()  # Nothing was tracked while disabled
+
+    # Decide what to do with a request to show `value` on `half`.
+    # Returns (COMMIT, None), (UNCHANGED, None) or (PENDING, (due, token, new)); for a new
+    # pending transition, call take_due(half, token) at `due` (clock time) to commit it.
+    def request(self, half, value):
+        now = self.clock()
+        with self._locked():
+            pending = self.pending[half]
+            if value == self.committed[half]:
+                if pending is not None:
+                    self.pending[half] = None
+                    self.suppressed[half] += 1
+                return UNCHANGED, None
+            if pending is not None:
+                if pending[0] == value:
+                    return PENDING, (pending[1], pending[2], False)  # Stable since the first request
+                self.suppressed[half] += 1
+
+            due = max(self.committed_at[half] + self.min_dwell, now + self.stable_for)
+            if due <= now:
+                self.pending[half] = None
+                self._commit(half, value, now)
+                return COMMIT, None
+            token = self.next_token
+            self.next_token += 1
+            self.pending[half] = (value, due, token)
+            return PENDING, (due, token, True)
+
+    # Commit the pending transition identified by `token`. Returns its value, or None if
+    # it was replaced or cancelled in the meantime.
+    def take_due(self, half, token):
+        with self._locked():
+            pending = self.pending[half]
+            if pending is None or pending[2] != token:
+                return None
+            self.pending[half] = None
+            self._commit(half, pending[0], self.clock())
+            return pending[0]
+
+    # Drop the pending transition identified by `token`, counting it as suppressed (it is no
+    # longer wanted, e.g. outside of the operating hours). Returns True if it was still pending.
+    def drop(self, half, token):
+        with self._locked():
+            pending = self.pending[half]
+            if pending is None or pending[2] != token:
+                return False
+            self.pending[half] = None
+            self.suppressed[half] += 1
+            return True
+
+    def _commit(self, half, value, now):
+        self.committed[half] = value
+        self.committed_at[half] = now
+
+    # Forget what is shown on `halves` (the write failed), so the next request is written again
+    def invalidate(self, halves=HALVES):
+        with self._locked():
+            for half in halves:
+                self.committed[half] = None
+                self.committed_at[half] = float("-inf")
+
+    # Forget everything, including pending transitions (the LEDs were turned off by the schedule)
+    def reset(self):
+        with self._locked():
+            for half in HALVES:
+                self.committed[half] = None
+                self.committed_at[half] = float("-inf")
+                self.pending[half] = None
+
+    def status(self):
+        now = self.clock()
+        with self._locked():
+            return {
+                "min_dwell": self.min_dwell,
+                "stable_for": self.stable_for,
+                "suppressed": dict(self.suppressed),
+                "pending": {half: round(max(0.0, pending[1] - now), 1) if pending else None
+                            for half, pending in self.pending.items()},
+            }
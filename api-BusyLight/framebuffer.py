@@ -0,0 +1,402 @@
+# ---------------------------------------------------------------------------------------
+# Project: BusyLight API - Shared framebuffer
+# Author: Evaristo R. Rivieccio Vega - SysAdmin
+# GitHub: https://github.com/evaristorivi
+# LinkedIn: https://www.linkedin.com/in/evaristorivieccio/
+# Web: https://www.evaristorivieccio.es/
+# ---------------------------------------------------------------------------------------
+# Description:
+# Lets several uvicorn workers (`--workers N`) control the same LED strip. Only one
+# process, led_owner.py, talks to the hardware; the API workers write the colors into a
+# shared-memory framebuffer and the owner pushes every new frame to the strip.
+#
+# Layout of the shared memory block:
+#   version   uint32  incremented before and after every write (odd = write in progress)
+#   led_count uint32  number of pixels currently driven by the owner
+#   pixels    uint32 * MAX_PIXELS  one Color() value per LED
+#   power     status of the owner's power governor (see power.py), for /API/power
+#   transitions  occupancy log: count of transitions ever written, time the log started,
+#             current state of each zone and a ring of the last TRANSITIONS (timestamp,
+#             zone, state) events (see stats.py)
+#   damping   flap damping state shared by the workers (see damping.py)
+#
+# - Writers serialize with flock() on a lock file and bump the version around the write.
+# - Readers never lock: they copy the pixels and retry if the version was odd or changed
+#   during the copy (seqlock).
+# - The state transitions of the zones are written under the same lock as the pixels they
+#   belong to. Every worker replays them into its own statistics, so /API/stats gives the
+#   same answer whichever worker serves it.
+# - After a write, the writer sends one byte to a FIFO so the owner wakes up at once.
+#   The byte is only a hint: if the FIFO is full or the owner is not running it is
+#   dropped, and the owner still picks up the new version on its next periodic check.
+# - The FIFO and the lock file live in a private directory (mode 0700, files 0600): any
+#   process able to open the lock file could hold the lock and stall every worker, so the
+#   owner and the workers must run as the same user.
+#
+# Set `owner = shared` in the [led] section of busylight.conf to use it.
+# ---------------------------------------------------------------------------------------
+
+import errno
+import fcntl
+from contextlib import contextmanager
+import os
+import select
+import struct
+import time as t
+from array import array
+from multiprocessing import shared_memory
+from stats import EVENT, STATES, ZONES
+
+MAX_PIXELS = 1024
+HEADER = struct.Struct("<II")
+VERSION = struct.Struct("<I")
+PIXEL = struct.Struct("<I")
+# budget_ma, estimate_ma, limited_ma, brightness, configured_brightness, limited_frames
+POWER = struct.Struct("<fffIII")
+POWER_OFFSET = HEADER.size + 4 * MAX_PIXELS
+# transitions written so far, start of the log (epoch seconds), state index of each zone
+TRANSITIONS_HEADER = struct.Struct("<Qd" + "B" * len(ZONES))
+TRANSITIONS_OFFSET = POWER_OFFSET + POWER.size
+TRANSITIONS = 4096
+EVENTS_OFFSET = TRANSITIONS_OFFSET + TRANSITIONS_HEADER.size
+# initialized, next token; then per half: committed (set, color, state index, time),
+# pending (set, color, state index, due, token) and suppressed transitions
+DAMPING_HEADER = struct.Struct("<?Q")
+DAMPING_HALF = struct.Struct("<?IBd?IBdQQ")
+DAMPING_OFFSET = EVENTS_OFFSET + EVENT.size * TRANSITIONS
+SIZE = DAMPING_OFFSET + DAMPING_HEADER.size + DAMPING_HALF.size * len(ZONES)
+
+
+class OwnerUnavailable(RuntimeError):
+    pass
+
+
+# Create the directory of the FIFO and the lock file, readable by this user only
+def _make_private_dir(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+
+# Open (or create) the shared memory block without registering it for removal at exit:
+# the block must outlive any single process so the frame survives restarts.
+def _open_block(name, create=False):
+    try:
+        return shared_memory.SharedMemory(name=name, create=create, size=SIZE if create else 0, track=False)
+    except TypeError:
+        # Python < 3.13 has no `track` argument
+        from multiprocessing import resource_tracker
+        block = shared_memory.SharedMemory(name=name, create=create, size=SIZE if create else 0)
+        resource_tracker.unregister(block._name, "shared_memory")
+        return block
+
+
+class SharedFramebuffer:
+    def __init__(self, block, notify_path):
+        self.block = block
+        self.buffer = block.buf
+        self.notify_path = notify_path
+        _make_private_dir(notify_path)
+        self.lock_fd = os.open(notify_path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+        self.notify_fd = None
+
+    # Open the framebuffer from the owner process. An existing block is reused, so the
+    # last frame is restored when the owner restarts; it is only recreated if too small.
+    @classmethod
+    def create(cls, name, notify_path, led_count):
+        try:
+            block = _open_block(name)
+            if block.size < SIZE:
+                block.close()
+                block.unlink()
+                block = _open_block(name, create=True)
+        except FileNotFoundError:
+            block = _open_block(name, create=True)
+        framebuffer = cls(block, notify_path)
+        version, _ = HEADER.unpack_from(framebuffer.buffer, 0)
+        # A writer may have died in the middle of a write: leave the version even again
+        HEADER.pack_into(framebuffer.buffer, 0, (version + (version & 1)) & 0xFFFFFFFF, led_count)
+        count, origin, *states = TRANSITIONS_HEADER.unpack_from(framebuffer.buffer, TRANSITIONS_OFFSET)
+        if origin == 0:
+            # New block: the occupancy log starts now, with every zone off
+            TRANSITIONS_HEADER.pack_into(framebuffer.buffer, TRANSITIONS_OFFSET, 0, t.time(), *states)
+        return framebuffer
+
+    # Attach to the framebuffer opened by the owner (API workers)
+    @classmethod
+    def attach(cls, name, notify_path):
+        try:
+            block = _open_block(name)
+        except FileNotFoundError:
+            raise OwnerUnavailable(f"LED owner is not running (shared memory '{name}' not found)")
+        return cls(block, notify_path)
+
+    def version(self):
+        return VERSION.unpack_from(self.buffer, 0)[0]
+
+    def led_count(self):
+        return HEADER.unpack_from(self.buffer, 0)[1]
+
+    def set_led_count(self, led_count):
+        self.write({}, led_count)
+
+    # Write {index: color} into the framebuffer, and the new {zone index: state index} of the
+    # zones into the transition log, then notify the owner
+    def write(self, pixels, led_count=None, states=None):
+        fcntl.flock(self.lock_fd, fcntl.LOCK_EX)
+        try:
+            version, current_count = HEADER.unpack_from(self.buffer, 0)
+            version += version & 1  # Odd only if a previous writer died in the middle of a write
+            HEADER.pack_into(self.buffer, 0, (version + 1) & 0xFFFFFFFF, current_count)
+            for index, color in pixels.items():
+                PIXEL.pack_into(self.buffer, HEADER.size + 4 * index, color)
+            if led_count is None:
+                led_count = current_count
+            HEADER.pack_into(self.buffer, 0, (version + 2) & 0xFFFFFFFF, led_count)
+            if states:
+                self._append_transitions(states)
+        finally:
+            fcntl.flock(self.lock_fd, fcntl.LOCK_UN)
+        self.notify()
+
+    # Must be called with the lock held. Only real transitions are logged, so the workers
+    # turning the strip off every minute outside of the schedule do not fill the ring.
+    def _append_transitions(self, states):
+        count, origin, *current = TRANSITIONS_HEADER.unpack_from(self.buffer, TRANSITIONS_OFFSET)
+        now = t.time()
+        for zone, state in sorted(states.items()):
+            if current[zone] == state:
+                continue
+            EVENT.pack_into(self.buffer, EVENTS_OFFSET + EVENT.size * (count % TRANSITIONS), now, zone, state)
+            current[zone] = state
+            count += 1
+        TRANSITIONS_HEADER.pack_into(self.buffer, TRANSITIONS_OFFSET, count, origin, *current)
+
+    # Transitions written since transition number `first` (None: the oldest one still in the
+    # ring). Returns (count, origin, [(timestamp, zone index, state index), ...]).
+    def read_transitions(self, first=None):
+        fcntl.flock(self.lock_fd, fcntl.LOCK_EX)
+        try:
+            count, origin, *_ = TRANSITIONS_HEADER.unpack_from(self.buffer, TRANSITIONS_OFFSET)
+            oldest = max(0, count - TRANSITIONS)
+            first = oldest if first is None else max(first, oldest)
+            events = [EVENT.unpack_from(self.buffer, EVENTS_OFFSET + EVENT.size * (number % TRANSITIONS))
+                      for number in range(first, count)]
+        finally:
+            fcntl.flock(self.lock_fd, fcntl.LOCK_UN)
+        return count, origin, events
+
+    # Exclusive access to the areas that are read and written under the lock
+    @contextmanager
+    def locked(self):
+        fcntl.flock(self.lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.lock_fd, fcntl.LOCK_UN)
+
+    # Damping state as used by FlapDamper (None if it was never saved). Lock held.
+    def read_damping(self):
+        initialized, next_token = DAMPING_HEADER.unpack_from(self.buffer, DAMPING_OFFSET)
+        if not initialized:
+            return None
+        committed, committed_at, pending, suppressed = {}, {}, {}, {}
+        for i, half in enumerate(ZONES):
+            (has_committed, color, state, at, has_pending, pending_color, pending_state, due, token,
+             count) = DAMPING_HALF.unpack_from(self.buffer, DAMPING_OFFSET + DAMPING_HEADER.size + DAMPING_HALF.size * i)
+            committed[half] = (color, STATES[state]) if has_committed else None
+            committed_at[half] = at if has_committed else float("-inf")
+            pending[half] = ((pending_color, STATES[pending_state]), due, token) if has_pending else None
+            suppressed[half] = count
+        return committed, committed_at, pending, suppressed, next_token
+
+    def write_damping(self, snapshot):
+        committed, committed_at, pending, suppressed, next_token = snapshot
+        DAMPING_HEADER.pack_into(self.buffer, DAMPING_OFFSET, True, next_token)
+        for i, half in enumerate(ZONES):
+            color, state = committed[half] or (0, STATES[0])
+            (pending_color, pending_state), due, token = pending[half] or ((0, STATES[0]), 0.0, 0)
+            DAMPING_HALF.pack_into(self.buffer, DAMPING_OFFSET + DAMPING_HEADER.size + DAMPING_HALF.size * i,
+                                   committed[half] is not None, color, STATES.index(state),
+                                   committed_at[half] if committed[half] is not None else 0.0,
+                                   pending[half] is not None, pending_color, STATES.index(pending_state), due, token,
+                                   suppressed[half])
+
+    # Lock-free consistent copy of the frame: (version, pixels)
+    def snapshot(self):
+        for _ in range(1000):
+            version, led_count = HEADER.unpack_from(self.buffer, 0)
+            if version & 1:
+                t.sleep(0)  # A write is in progress
+                continue
+            pixels = array("I", bytes(self.buffer[HEADER.size:HEADER.size + 4 * led_count]))
+            if self.version() == version:
+                return version, pixels
+        # Still inconsistent: a writer died in the middle of a write. Read under the lock.
+        fcntl.flock(self.lock_fd, fcntl.LOCK_EX)
+        try:
+            version, led_count = HEADER.unpack_from(self.buffer, 0)
+            return version, array("I", bytes(self.buffer[HEADER.size:HEADER.size + 4 * led_count]))
+        finally:
+            fcntl.flock(self.lock_fd, fcntl.LOCK_UN)
+
+    # Power governor status, written by the owner after every frame. It is only a report,
+    # so it is not protected by the version: a read racing a write may mix two frames.
+    def write_power(self, status):
+        POWER.pack_into(self.buffer, POWER_OFFSET, status["budget_ma"], status["estimate_ma"],
+                        status["limited_ma"], status["brightness"], status["configured_brightness"],
+                        status["limited_frames"])
+
+    def read_power(self):
+        budget, estimate, limited, brightness, configured, frames = POWER.unpack_from(self.buffer, POWER_OFFSET)
+        return {
+            "budget_ma": round(budget, 1),
+            "estimate_ma": round(estimate, 1),
+            "limited_ma": round(limited, 1),
+            "limited": brightness < configured,
+            "brightness": brightness,
+            "configured_brightness": configured,
+            "limited_frames": frames,
+        }
+
+    def notify(self):
+        try:
+            if self.notify_fd is None:
+                self.notify_fd = os.open(self.notify_path, os.O_WRONLY | os.O_NONBLOCK)
+            os.write(self.notify_fd, b"\0")
+        except OSError as e:
+            # ENXIO: no owner reading the FIFO, EAGAIN: notifications already pending
+            if e.errno not in (errno.ENXIO, errno.EAGAIN, errno.ENOENT, errno.EPIPE):
+                raise
+            if e.errno != errno.EAGAIN and self.notify_fd is not None:
+                os.close(self.notify_fd)
+                self.notify_fd = None
+
+    def close(self):
+        if self.notify_fd is not None:
+            os.close(self.notify_fd)
+        os.close(self.lock_fd)
+        self.buffer = None
+        self.block.close()
+
+
+# Owner side of the notification FIFO
+class ChangeListener:
+    def __init__(self, path):
+        self.path = path
+        _make_private_dir(path)
+        try:
+            os.mkfifo(path, 0o600)
+        except FileExistsError:
+            pass
+        self.fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+        # Keep a writer open so select() does not report EOF when no worker has it open
+        self.keepalive_fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+
+    # Wait for a notification or until `timeout` seconds have passed
+    def wait(self, timeout):
+        if select.select([self.fd], [], [], timeout)[0]:
+            try:
+                while os.read(self.fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        os.close(self.keepalive_fd)
+        os.close(self.fd)
+
+
+# Drop-in replacement for Adafruit_NeoPixel used by the API workers when the strip is
+# driven by led_owner.py. Only the methods used by the API are implemented.
+class FramebufferStrip:
+    def __init__(self, name, notify_path):
+        self.name = name
+        self.notify_path = notify_path
+        self.framebuffer = None
+        self.dirty = {}
+        self.states = {}
+        self.transitions_read = None
+
+    def _framebuffer(self):
+        if self.framebuffer is None:
+            self.framebuffer = SharedFramebuffer.attach(self.name, self.notify_path)
+        return self.framebuffer
+
+    def begin(self):
+        try:
+            self._framebuffer()
+        except OwnerUnavailable:
+            pass  # Attach on first use, the owner may start after the API
+
+    def setPixelColor(self, index, color):
+        self.dirty[index] = color
+
+    def getPixelColor(self, index):
+        if index in self.dirty:
+            return self.dirty[index]
+        _, pixels = self._framebuffer().snapshot()
+        return pixels[index] if index < len(pixels) else 0
+
+    # New state ("off", "green"...) of a half ("left", "right" or None for both), written
+    # to the transition log by the next show()
+    def setZoneState(self, half, state):
+        for zone in (ZONES if half is None else (half,)):
+            self.states[ZONES.index(zone)] = STATES.index(state)
+
+    def show(self):
+        # Only the pixels changed by this worker are written, so workers never overwrite
+        # each other's halves with stale values. If the owner is not running the changes
+        # are dropped: the request failed and must not be applied with a later one.
+        if not self.dirty and not self.states:
+            return
+        dirty, self.dirty = self.dirty, {}
+        states, self.states = self.states, {}
+        self._framebuffer().write(dirty, states=states)
+
+    # Transitions written by any worker since the previous call, as (timestamp, half, state).
+    # The first call returns all those still in the ring, and when the history they start at
+    # (the start of the log, or the oldest transition kept if the ring wrapped around).
+    def read_transitions(self):
+        first = self.transitions_read
+        count, origin, events = self._framebuffer().read_transitions(first)
+        self.transitions_read = count
+        start = None
+        if first is None:
+            start = origin if count <= TRANSITIONS or not events else events[0][0]
+        return start, [(timestamp, ZONES[zone], STATES[state]) for timestamp, zone, state in events]
+
+    def setBrightness(self, brightness):
+        pass  # Brightness is applied by the owner from its own configuration
+
+    # Status of the power governor of the owner
+    def power_status(self):
+        return self._framebuffer().read_power()
+
+    def _cleanup(self):
+        if self.framebuffer is not None:
+            self.framebuffer.close()
+            self.framebuffer = None
+
+
+# Store of FlapDamper (see damping.py) in the framebuffer of the strip returned by `get_strip`
+class SharedDampingStore:
+    def __init__(self, get_strip):
+        self.get_strip = get_strip
+        self.framebuffer = None
+
+    @contextmanager
+    def locked(self):
+        framebuffer = self.get_strip()._framebuffer()
+        with framebuffer.locked():
+            self.framebuffer = framebuffer
+            try:
+                yield
+            finally:
+                self.framebuffer = None
+
+    def load(self):
+        return self.framebuffer.read_damping()
+
+    def save(self, snapshot):
+        self.framebuffer.write_damping(snapshot)
@@ -0,0 +1,117 @@
+# ---------------------------------------------------------------------------------------
+# Project: BusyLight API - LED owner process
+# Author: Evaristo R. Rivieccio Vega - SysAdmin
+# GitHub: https://github.com/evaristorivi
+# LinkedIn: https://www.linkedin.com/in/evaristorivieccio/
+# Web: https://www.evaristorivieccio.es/
+# ---------------------------------------------------------------------------------------
+# Description:
+# The only process that drives the LED strip when `owner = shared` is set in the [led]
+# section of busylight.conf. The API can then run with several uvicorn workers: they
+# write into the shared-memory framebuffer (see framebuffer.py) and this process pushes
+# every new frame to the strip.
+#
+# It wakes up as soon as a worker writes a frame (FIFO notification) and also checks the
+# framebuffer version every second, so a lost notification only delays a frame.
+# Brightness, power budget and LED hardware changes in the config file are applied live.
+# Every frame goes through the power governor (see power.py) before it is shown.
+# Frames pushed, reloads and errors go to the JSON event log of the [logging] section, like
+# the API (see logger.py); put {pid} in its path so the owner and the workers use separate files.
+#
+# Usage:
+# Run it before (or together with) the API, for example as its own systemd service:
+#    venv/bin/python3 led_owner.py
+#    venv/bin/uvicorn API:app --host 0.0.0.0 --port 5000 --workers 4
+# ---------------------------------------------------------------------------------------
+
+import os
+import threading
+import time as t
+from rpi_ws281x import Adafruit_NeoPixel
+import config
+from framebuffer import ChangeListener, SharedFramebuffer
+from logger import StructuredLogger, create_event_handler
+from power import PowerGovernor
+
+CONFIG_PATH = os.environ.get("BUSYLIGHT_CONFIG", config.DEFAULT_CONFIG_PATH)
+
+settings = config.load_settings(CONFIG_PATH)
+strip_lock = threading.Lock()
+redraw = threading.Event()
+
+# JSON event log written by a background thread (see logger.py and the [logging] config section)
+logger = StructuredLogger(settings.logging_queue_size, create_event_handler(settings))
+
+# Create NeoPixel object with the appropriate configuration.
+def create_strip(current):
+    new_strip = Adafruit_NeoPixel(current.led_count, current.led_pin, current.led_freq_hz,
+                                  current.led_dma, current.led_invert, current.led_brightness)
+    # Initialize the library (must be called once before other functions).
+    new_strip.begin()
+    return new_strip
+
+strip = create_strip(settings)
+framebuffer = SharedFramebuffer.create(settings.led_shared_memory, settings.led_notify_path, settings.led_count)
+listener = ChangeListener(settings.led_notify_path)
+governor = PowerGovernor(*settings.power)
+
+# Function to apply a new settings snapshot without restarting the process
+def apply_settings(new_settings):
+    global settings, strip
+    with strip_lock:
+        old_settings = settings
+        if new_settings.backend[1:] != old_settings.backend[1:]:
+            logger.log("restart_needed", "warning", keys=["shared_memory", "notify_path"])
+        if new_settings.hardware != old_settings.hardware:
+            strip._cleanup()
+            try:
+                strip = create_strip(new_settings)
+            except Exception:
+                # Go back to the previous strip and settings; the config watcher reports the error
+                strip = create_strip(old_settings)
+                redraw.set()
+                raise
+            framebuffer.set_led_count(new_settings.led_count)
+        governor.configure(*new_settings.power)
+        settings = new_settings
+    logging_keys = ("logging_path", "logging_max_bytes", "logging_backups")
+    changed = any(getattr(new_settings, key) != getattr(old_settings, key) for key in logging_keys)
+    logger.configure(new_settings.logging_queue_size,
+                     create_event_handler(new_settings) if changed else logger.file_handler)
+    redraw.set()
+    logger.log("config_reloaded", path=CONFIG_PATH)
+
+# Function to push the current frame to the strip
+def show_frame():
+    version, pixels = framebuffer.snapshot()
+    with strip_lock:
+        for index, color in enumerate(pixels):
+            strip.setPixelColor(index, color)
+        brightness = governor.govern(pixels)
+        strip.setBrightness(brightness)
+        start = t.perf_counter()
+        strip.show()
+        show_ms = (t.perf_counter() - start) * 1000
+    framebuffer.write_power(governor.status())
+    logger.log("frame_shown", version=version, brightness=brightness, show_ms=round(show_ms, 3))
+    return version
+
+def main():
+    config.ConfigWatcher(CONFIG_PATH, apply_settings,
+                         on_error=lambda message: logger.log("config_error", "error", message=message)).start()
+    logger.log("owner_started", shared_memory=settings.led_shared_memory, led_count=settings.led_count)
+
+    # Restore the last frame written before a restart
+    shown = None
+    while True:
+        if framebuffer.version() != shown or redraw.is_set():
+            redraw.clear()
+            try:
+                shown = show_frame()
+            except Exception as e:
+                # Keep the owner running: the frame is tried again on the next check
+                logger.log("frame_failed", "error", error=str(e))
+        listener.wait(1)
+
+if __name__ == "__main__":
+    main()
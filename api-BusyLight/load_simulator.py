@@ -0,0 +1,272 @@
+# ---------------------------------------------------------------------------------------
+# Project: BusyLight API - Fleet load simulator
+# Author: Evaristo R. Rivieccio Vega - SysAdmin
+# GitHub: https://github.com/evaristorivi
+# LinkedIn: https://www.linkedin.com/in/evaristorivieccio/
+# Web: https://www.evaristorivieccio.es/
+# ---------------------------------------------------------------------------------------
+# Description:
+# Simulates hundreds or thousands of desks using the same BusyLight API, to find out how
+# many clients a single Raspberry Pi can serve.
+#
+# Every simulated client follows the same state machine as mic-in-use-gnu-linux.py: it
+# sends its initial state, checks the microphone every 5 seconds and only calls
+# /API/signal when the state changes ("red" in a call, "green" otherwise). When the
+# simulation ends it calls /API/off, like the optional leds-off script.
+#
+# Calls start after an exponentially distributed idle time and last a log-normally
+# distributed time. Short microphone blips (notification sounds) are simulated too.
+# Simulated time can run faster than real time with --speed.
+#
+# By default the API is loaded in this process on a stubbed LED backend (the real strip
+# is never touched) and the requests go through the ASGI app directly. Use --url to load
+# a running API over HTTP instead (frames pushed are not available then). The in-process
+# API ignores the [schedule] section, like replay.py, so the result does not depend on the
+# time of day; use --keep-schedule to apply it.
+#
+# Report: throughput, p50/p95/p99 latency of /API/signal and /API/off, error and 403
+# rates and the number of frames pushed to the (stubbed) strip.
+#
+# Requirements: pip install httpx
+#
+# Example:
+#    python3 load_simulator.py --clients 500 --duration 60 --speed 60
+#    python3 load_simulator.py --clients 200 --url http://192.168.1.129:5000
+# ---------------------------------------------------------------------------------------
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time as t
+import types
+from collections import Counter
+
+try:
+    import httpx
+except ImportError:
+    sys.exit("This tool needs httpx: pip install httpx")
+
+
+# Stubbed LED backend: same interface as rpi_ws281x, counts the frames pushed
+def install_stub_backend(show_ms):
+    stub = types.ModuleType("rpi_ws281x")
+    stub.frames = 0
+
+    def Color(red, green, blue, white=0):
+        return (white << 24) | (red << 16) | (green << 8) | blue
+
+    class Adafruit_NeoPixel:
+        def __init__(self, num, pin, freq_hz=800000, dma=10, invert=False, brightness=255, channel=0, strip_type=None):
+            self.pixels = [0] * num
+            self.brightness = brightness
+
+        def begin(self):
+            pass
+
+        def show(self):
+            # Pushing a frame blocks the calling thread, like the real DMA transfer
+            t.sleep(show_ms / 1000)
+            stub.frames += 1
+
+        def setPixelColor(self, n, color):
+            self.pixels[n] = color
+
+        def getPixelColor(self, n):
+            return self.pixels[n]
+
+        def getPixels(self):
+            return self.pixels
+
+        def setBrightness(self, brightness):
+            self.brightness = brightness
+
+        def getBrightness(self):
+            return self.brightness
+
+        def _cleanup(self):
+            pass
+
+    stub.Color = Color
+    stub.Adafruit_NeoPixel = Adafruit_NeoPixel
+    sys.modules["rpi_ws281x"] = stub
+    return stub
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Results:
+    def __init__(self):
+        self.latencies = {"/API/signal": [], "/API/off": []}
+        self.statuses = {"/API/signal": Counter(), "/API/off": Counter()}
+
+    def add(self, path, latency, status):
+        self.latencies[path].append(latency)
+        self.statuses[path][status] += 1
+
+
+# Microphone activity of one desk, in simulated seconds
+class Desk:
+    def __init__(self, rng, args):
+        self.rng = rng
+        self.args = args
+        self.call_start = self._next_idle(0)
+        self.call_end = self.call_start + self._call_length()
+        self.blip_start = self._next_blip(0)
+        self.blip_end = self.blip_start + self.rng.uniform(1, 3)
+
+    def _next_idle(self, now):
+        return now + self.rng.expovariate(1 / (self.args.idle_minutes * 60))
+
+    def _call_length(self):
+        # Log-normal: median call_minutes, long tail of long meetings
+        return 60 * self.rng.lognormvariate(math.log(self.args.call_minutes), 0.6)
+
+    def _next_blip(self, now):
+        if self.args.blips_per_hour <= 0:
+            return math.inf
+        return now + self.rng.expovariate(self.args.blips_per_hour / 3600)
+
+    def mic_in_use(self, now):
+        while now >= self.call_end:
+            self.call_start = self._next_idle(self.call_end)
+            self.call_end = self.call_start + self._call_length()
+        while now >= self.blip_end:
+            self.blip_start = self._next_blip(self.blip_end)
+            self.blip_end = self.blip_start + self.rng.uniform(1, 3)
+        return self.call_start <= now < self.call_end or self.blip_start <= now < self.blip_end
+
+
+async def post(client, results, path, payload):
+    start = t.perf_counter()
+    try:
+        response = await client.post(path, json=payload)
+        status = response.status_code
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    results.add(path, t.perf_counter() - start, status)
+
+
+# One simulated client, same logic as mic-in-use-gnu-linux.py
+async def run_client(number, client, results, args, stop_at):
+    rng = random.Random(args.seed + number)
+    desk = Desk(rng, args)
+    payload = {}
+    if args.full_mode_ratio < rng.random():
+        payload["half"] = ("left", "right")[number % 2]
+
+    # Reconnect storm: every client starts within the ramp-up window
+    await asyncio.sleep(rng.uniform(0, args.ramp))
+    started = t.monotonic()
+
+    def simulated_now():
+        return (t.monotonic() - started) * args.speed
+
+    state = desk.mic_in_use(simulated_now())
+    await post(client, results, "/API/signal", {**payload, "color": "red" if state else "green"})
+
+    while t.monotonic() < stop_at:
+        await asyncio.sleep(args.poll / args.speed)
+        mic_in_use = desk.mic_in_use(simulated_now())
+        if mic_in_use != state:
+            await post(client, results, "/API/signal", {**payload, "color": "red" if mic_in_use else "green"})
+            state = mic_in_use
+
+    await post(client, results, "/API/off", payload)
+
+
+def report(results, elapsed, frames):
+    total = sum(len(values) for values in results.latencies.values())
+    summary = {"duration_s": round(elapsed, 2), "requests": total,
+               "throughput_rps": round(total / elapsed, 1) if elapsed else None,
+               "frames_pushed": frames, "endpoints": {}}
+    for path, latencies in results.latencies.items():
+        statuses = results.statuses[path]
+        count = len(latencies)
+        errors = sum(n for status, n in statuses.items() if status != 200 and status != 403)
+        summary["endpoints"][path] = {
+            "requests": count,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2) if count else None,
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2) if count else None,
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2) if count else None,
+            "error_rate": round(errors / count, 4) if count else None,
+            "forbidden_rate": round(statuses[403] / count, 4) if count else None,
+            "statuses": {str(status): n for status, n in statuses.items()},
+        }
+    return summary
+
+
+def print_report(summary):
+    print(f"Duration: {summary['duration_s']} s  Requests: {summary['requests']}  "
+          f"Throughput: {summary['throughput_rps']} req/s  Frames pushed: {summary['frames_pushed']}")
+    print(f"{'endpoint':<14}{'requests':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}{'403':>9}  statuses")
+    for path, data in summary["endpoints"].items():
+        def fmt(value, pattern="{:.2f}"):
+            return "-" if value is None else pattern.format(value)
+        print(f"{path:<14}{data['requests']:>10}{fmt(data['p50_ms']):>10}{fmt(data['p95_ms']):>10}"
+              f"{fmt(data['p99_ms']):>10}{fmt(data['error_rate'], '{:.2%}'):>9}{fmt(data['forbidden_rate'], '{:.2%}'):>9}"
+              f"  {data['statuses']}")
+
+
+async def simulate(args):
+    stub = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout,
+                                   limits=httpx.Limits(max_connections=args.clients))
+    else:
+        stub = install_stub_backend(args.show_ms)
+        if args.config:
+            os.environ["BUSYLIGHT_CONFIG"] = args.config
+        if not args.keep_schedule:
+            os.environ["BUSYLIGHT_IGNORE_SCHEDULE"] = "1"
+        import API
+        API.logger.echo = False  # Keep the report readable; the log file is still written
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=API.app), base_url="http://busylight",
+                                   timeout=args.timeout)
+
+    results = Results()
+    start = t.monotonic()
+    stop_at = start + args.duration
+    async with client:
+        await asyncio.gather(*(run_client(number, client, results, args, stop_at) for number in range(args.clients)))
+    return report(results, t.monotonic() - start, stub.frames if stub else None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BusyLight API fleet load simulator")
+    parser.add_argument("--clients", type=int, default=200, help="number of simulated desks")
+    parser.add_argument("--duration", type=float, default=60, help="real seconds to run")
+    parser.add_argument("--speed", type=float, default=60, help="simulated seconds per real second")
+    parser.add_argument("--ramp", type=float, default=2, help="real seconds over which clients start")
+    parser.add_argument("--poll", type=float, default=5, help="client polling interval, simulated seconds")
+    parser.add_argument("--idle-minutes", type=float, default=25, help="mean time between calls")
+    parser.add_argument("--call-minutes", type=float, default=20, help="median call length")
+    parser.add_argument("--blips-per-hour", type=float, default=2, help="short microphone blips per hour")
+    parser.add_argument("--full-mode-ratio", type=float, default=0, help="fraction of clients in full mode")
+    parser.add_argument("--show-ms", type=float, default=1.0, help="time spent pushing one frame (stub backend)")
+    parser.add_argument("--timeout", type=float, default=30, help="request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--config", help="config file for the in-process API (default: busylight.conf)")
+    parser.add_argument("--keep-schedule", action="store_true",
+                        help="apply the [schedule] section to the in-process API (403 outside of it)")
+    parser.add_argument("--url", help="load a running API instead of the in-process stubbed one")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    summary = asyncio.run(simulate(args))
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_report(summary)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# ---------------------------------------------------------------------------------------
+# Project: BusyLight API - Structured event log
+# Author: Evaristo R. Rivieccio Vega - SysAdmin
+# GitHub: https://github.com/evaristorivi
+# LinkedIn: https://www.linkedin.com/in/evaristorivieccio/
+# Web: https://www.evaristorivieccio.es/
+# ---------------------------------------------------------------------------------------
+# Description:
+# Non-blocking JSON event log for the API and led_owner.py (see the [logging] section of
+# busylight.conf).
+#
+# Producers (request handlers, the LED worker threads, the config watcher...) only put a
+# log record into a bounded queue (logging QueueHandler). A QueueListener thread takes
+# them out and prints them to the standard output (the systemd journal) and appends them
+# to a rotating JSONL file (RotatingFileHandler):
+#   {"ts": 1725260400.123, "level": "info", "event": "leds_updated", "halves": {...}, ...}
+#
+# When the queue is full the record is dropped and counted instead of making the caller
+# wait. The next record written is preceded by a "log_dropped" record with the number of
+# records lost, and /API/stats reports the totals.
+# ---------------------------------------------------------------------------------------
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time as t
+
+
+# The message of the records is the event dict itself; it is written as one compact line
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.msg, separators=(",", ":"))
+
+
+# Queue handler that drops records instead of blocking when the queue is full
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, size):
+        super().__init__(queue.Queue(size))
+        self.dropped = 0
+
+    # The queue stays in this process: keep the record as it is, its dict is formatted later
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# JSONL file rotated by size (file -> file.1 -> ... -> file.<backups>). Its folder is created
+# when the first record is written.
+class JsonlFileHandler(logging.handlers.RotatingFileHandler):
+    def __init__(self, path, max_bytes, backups):
+        super().__init__(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8", delay=True)
+        self.setFormatter(JsonFormatter())
+
+    def _open(self):
+        directory = os.path.dirname(self.baseFilename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return super()._open()
+
+    # Without backups RotatingFileHandler would keep appending: start an empty file instead
+    def doRollover(self):
+        if self.backupCount > 0:
+            super().doRollover()
+            return
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        if os.path.exists(self.baseFilename):
+            os.remove(self.baseFilename)
+
+
+# File handler of the [logging] section of a settings snapshot, or None to only print the
+# events. `{pid}` in the path gives every process its own file.
+def create_event_handler(current):
+    if not current.logging_path:
+        return None
+    return JsonlFileHandler(current.logging_path.replace("{pid}", str(os.getpid())),
+                            current.logging_max_bytes, current.logging_backups)
+
+
+# Listener that reports the records dropped since the last one written, and lets the
+# handlers be replaced while it runs
+class EventListener(logging.handlers.QueueListener):
+    def __init__(self, source, *handlers):
+        super().__init__(source.queue, *handlers)
+        self.source = source
+        # Held while a record is handled, so a handler is never closed in the middle of a write
+        self.lock = threading.Lock()
+        self.reported = 0
+        self.written = 0
+
+    def handle(self, record):
+        with self.lock:
+            dropped = self.source.dropped
+            if dropped != self.reported:
+                super().handle(_make_record("log_dropped", "warning",
+                                            {"dropped": dropped - self.reported, "total_dropped": dropped}))
+                self.reported = dropped
+            super().handle(record)
+            self.written += 1
+
+
+def _make_record(event, level, fields):
+    message = {"ts": round(t.time(), 6), "level": level, "event": event}
+    message.update(fields)
+    levelno = logging.getLevelName(level.upper())
+    return logging.LogRecord("busylight.events", levelno if isinstance(levelno, int) else logging.INFO,
+                             __file__, 0, message, None, None)
+
+
+class StructuredLogger:
+    def __init__(self, queue_size, file_handler=None, echo=True):
+        self.handler = DroppingQueueHandler(queue_size)
+        self.console = logging.StreamHandler(sys.stdout)
+        self.console.setFormatter(JsonFormatter())
+        self.file_handler = file_handler
+        self._echo = echo
+        self.listener = EventListener(self.handler, *self._outputs())
+        self.listener.start()
+
+    # Queue an event. Never blocks: the record is dropped if the queue is full.
+    def log(self, event, level="info", **fields):
+        self.handler.handle(_make_record(event, level, fields))
+
+    # Print the records to the standard output too (the file is written either way)
+    @property
+    def echo(self):
+        return self._echo
+
+    @echo.setter
+    def echo(self, value):
+        with self.listener.lock:
+            self._echo = value
+            self.listener.handlers = self._outputs()
+
+    # Apply a new queue size and file handler (a JsonlFileHandler, or None for no file)
+    def configure(self, queue_size, file_handler):
+        with self.handler.queue.mutex:
+            self.handler.queue.maxsize = queue_size
+        with self.listener.lock:
+            old_handler, self.file_handler = self.file_handler, file_handler
+            self.listener.handlers = self._outputs()
+        if old_handler is not None and old_handler is not file_handler:
+            old_handler.close()
+
+    def status(self):
+        return {
+            "queued": self.handler.queue.qsize(),
+            "capacity": self.handler.queue.maxsize,
+            "written": self.listener.written,
+            "dropped": self.handler.dropped,
+        }
+
+    def _outputs(self):
+        outputs = (self.console,) if self._echo else ()
+        return outputs + ((self.file_handler,) if self.file_handler is not None else ())
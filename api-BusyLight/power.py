@@ -0,0 +1,82 @@
+# ---------------------------------------------------------------------------------------
+# Project: BusyLight API - Power budget governor
+# Author: Evaristo R. Rivieccio Vega - SysAdmin
+# GitHub: https://github.com/evaristorivi
+# LinkedIn: https://www.linkedin.com/in/evaristorivieccio/
+# Web: https://www.evaristorivieccio.es/
+# ---------------------------------------------------------------------------------------
+# Description:
+# Estimates the current drawn by each frame before it is pushed to the strip and lowers
+# the brightness of frames that would go over the configured budget, to avoid brownouts
+# and resets of the Pi under sustained full-intensity colors.
+#
+# Each WS2812 LED draws roughly `channel_ma` per channel at full duty plus a small idle
+# current. The driver scales every channel value by the strip brightness
+# ((value * (brightness + 1)) >> 8), so the milliamps of every possible channel value
+# at the configured brightness are precomputed in one table per channel. Estimating a
+# frame is then one table lookup per channel and pixel.
+#
+# When a frame is over budget, the governor returns a lower brightness for that frame
+# (the stored colors are not changed), so the light gets dimmer instead of failing.
+# ---------------------------------------------------------------------------------------
+
+import threading
+
+
+class PowerGovernor:
+    def __init__(self, budget_ma, red_ma=20.0, green_ma=20.0, blue_ma=20.0, idle_ma=1.0, brightness=255):
+        self.lock = threading.Lock()
+        self.configure(budget_ma, red_ma, green_ma, blue_ma, idle_ma, brightness)
+        self.estimate_ma = 0.0
+        self.limited_ma = 0.0
+        self.brightness = brightness
+        self.limited_frames = 0
+
+    def configure(self, budget_ma, red_ma, green_ma, blue_ma, idle_ma, brightness):
+        tables = tuple(self._table(channel_ma, brightness) for channel_ma in (red_ma, green_ma, blue_ma))
+        with self.lock:
+            self.budget_ma = budget_ma
+            self.idle_ma = idle_ma
+            self.configured_brightness = brightness
+            self.red_table, self.green_table, self.blue_table = tables
+
+    # Milliamps drawn by one channel for every value 0-255 at `brightness`
+    @staticmethod
+    def _table(channel_ma, brightness):
+        return tuple(((value * (brightness + 1)) >> 8) * channel_ma / 255 for value in range(256))
+
+    # Estimate the current of a frame (sequence of Color values) and return the brightness
+    # to use for it: the configured one, or a lower one if the frame is over budget.
+    def govern(self, pixels):
+        with self.lock:
+            red_table, green_table, blue_table = self.red_table, self.green_table, self.blue_table
+            estimate = self.idle_ma * len(pixels)
+            for color in pixels:
+                estimate += red_table[color >> 16 & 0xFF] + green_table[color >> 8 & 0xFF] + blue_table[color & 0xFF]
+
+            brightness = self.configured_brightness
+            limited = estimate
+            if self.budget_ma > 0 and estimate > self.budget_ma:
+                idle = self.idle_ma * len(pixels)
+                # The channel current scales with (brightness + 1); the idle current does not
+                scale = max(0.0, self.budget_ma - idle) / (estimate - idle)
+                brightness = max(0, int((self.configured_brightness + 1) * scale) - 1)
+                limited = idle + (estimate - idle) * (brightness + 1) / (self.configured_brightness + 1)
+                self.limited_frames += 1
+
+            self.estimate_ma = estimate
+            self.limited_ma = limited
+            self.brightness = brightness
+            return brightness
+
+    def status(self):
+        with self.lock:
+            return {
+                "budget_ma": self.budget_ma,
+                "estimate_ma": round(self.estimate_ma, 1),
+                "limited_ma": round(self.limited_ma, 1),
+                "limited": self.brightness < self.configured_brightness,
+                "brightness": self.brightness,
+                "configured_brightness": self.configured_brightness,
+                "limited_frames": self.limited_frames,
+            }
@@ -0,0 +1,132 @@
+# ---------------------------------------------------------------------------------------
+# Project: BusyLight API - Sampling profiler
+# Author: Evaristo R. Rivieccio Vega - SysAdmin
+# GitHub: https://github.com/evaristorivi
+# LinkedIn: https://www.linkedin.com/in/evaristorivieccio/
+# Web: https://www.evaristorivieccio.es/
+# ---------------------------------------------------------------------------------------
+# Description:
+# On-demand sampling profiler for the live service, used by /API/admin/profile.
+#
+# While a session runs, a background thread takes the stack of every other thread (event
+# loop, schedule checker, config watcher, LED worker threads...) at a fixed interval and
+# counts identical stacks. The result is returned in the "collapsed stack" format used by
+# flame graph tools (one line per stack: "thread;outer;...;inner count").
+#
+# The route timing middleware measures the requests served during the session.
+#
+# When no session is running there is no sampler thread and the middleware only checks
+# one flag per request.
+# ---------------------------------------------------------------------------------------
+
+import os
+import sys
+import threading
+import time as t
+from collections import Counter, defaultdict
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = False
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.stacks = Counter()
+        self.samples = 0
+        self.routes = defaultdict(list)
+        self.started = None
+        self.interval = None
+
+    def start(self, interval):
+        with self.lock:
+            if self.active:
+                raise ProfilerBusy()
+            self.stacks = Counter()
+            self.samples = 0
+            self.routes = defaultdict(list)
+            self.interval = interval
+            self.stop_event.clear()
+            self.started = t.perf_counter()
+            self.thread = threading.Thread(target=self._sample, daemon=True, name="sampling-profiler")
+            self.active = True
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        with self.lock:
+            self.active = False
+            return self._result(t.perf_counter() - self.started)
+
+    def record_route(self, route, seconds):
+        if self.active:
+            self.routes[route].append(seconds)
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def _result(self, duration):
+        # Functions seen at the top of the stack (self) and anywhere in it (total)
+        own = Counter()
+        total = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            if frames:
+                own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+
+        routes = {}
+        for route, timings in self.routes.items():
+            timings = sorted(timings)
+            routes[route] = {
+                "requests": len(timings),
+                "mean_ms": round(sum(timings) / len(timings) * 1000, 3),
+                "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000, 3),
+                "max_ms": round(timings[-1] * 1000, 3),
+            }
+
+        return {
+            "duration_s": round(duration, 3),
+            "interval_ms": round(self.interval * 1000, 3),
+            "samples": self.samples,
+            "top_self": [{"function": name, "samples": count} for name, count in own.most_common(20)],
+            "top_total": [{"function": name, "samples": count} for name, count in total.most_common(20)],
+            "routes": routes,
+            "collapsed": "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()),
+        }
+
+
+# ASGI middleware that times every request while a profiling session is active
+class RouteTimingMiddleware:
+    def __init__(self, app, profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if not self.profiler.active or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = t.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.record_route(f"{scope['method']} {scope['path']}", t.perf_counter() - start)
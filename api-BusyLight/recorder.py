@@ -0,0 +1,126 @@
+# ---------------------------------------------------------------------------------------
+# Project: BusyLight API - Request recorder
+# Author: Evaristo R. Rivieccio Vega - SysAdmin
+# GitHub: https://github.com/evaristorivi
+# LinkedIn: https://www.linkedin.com/in/evaristorivieccio/
+# Web: https://www.evaristorivieccio.es/
+# ---------------------------------------------------------------------------------------
+# Description:
+# Opt-in recording of the control requests (/API/signal and /API/off) so real office
+# traffic can be replayed later with replay.py.
+#
+# Every request is appended to a JSONL trace, one compact line per request:
+#   {"ts": arrival time (epoch seconds), "path": "/API/signal", "body": {...},
+#    "status": 200, "latency_ms": 1.23}
+# When the trace grows over `max_bytes` it is rotated like a log file
+# (trace.jsonl -> trace.jsonl.1 -> ... -> trace.jsonl.<backups>). The middleware only
+# queues the record; the file is written by a background thread, like the event log, so a
+# slow SD card never holds up the event loop.
+#
+# Enable it in the [recorder] section of busylight.conf. When it is disabled the
+# middleware only checks one flag per request.
+# ---------------------------------------------------------------------------------------
+
+import json
+import logging
+import logging.handlers
+import os
+import time as t
+
+from logger import DroppingQueueHandler, JsonlFileHandler
+
+RECORDED_PATHS = frozenset(("/API/signal", "/API/off"))
+# Records waiting to be written. When the queue is full new records are dropped (and counted)
+QUEUE_SIZE = 10000
+
+
+# Listener that waits for room in the queue to stop, instead of failing when it is full
+class TraceListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+# JSONL trace with size based rotation, written by a background thread (see logger.py)
+class TraceWriter:
+    def __init__(self, path, max_bytes, backups, queue_size=QUEUE_SIZE):
+        self.handler = DroppingQueueHandler(queue_size)
+        self.file = JsonlFileHandler(path, max_bytes, backups)
+        self.listener = TraceListener(self.handler.queue, self.file)
+        self.listener.start()
+
+    # Queue a record. Never blocks: the record is dropped if the queue is full.
+    def write(self, record):
+        self.handler.handle(logging.makeLogRecord({"msg": record}))
+
+    @property
+    def dropped(self):
+        return self.handler.dropped
+
+    # Write the records still queued, then close the file
+    def close(self):
+        self.listener.stop()
+        self.file.close()
+
+
+# Read a trace in arrival order, including its rotated files (oldest first)
+def load_trace(path):
+    files = []
+    index = 1
+    while os.path.exists(f"{path}.{index}"):
+        files.append(f"{path}.{index}")
+        index += 1
+    files.reverse()
+    if os.path.exists(path):
+        files.append(path)
+
+    records = []
+    for name in files:
+        with open(name, encoding="utf-8") as trace:
+            for line in trace:
+                if line.strip():
+                    records.append(json.loads(line))
+    return records
+
+
+# ASGI middleware. `get_writer` returns the TraceWriter to use, or None when disabled.
+class RecorderMiddleware:
+    def __init__(self, app, get_writer):
+        self.app = app
+        self.get_writer = get_writer
+
+    async def __call__(self, scope, receive, send):
+        writer = self.get_writer() if scope["type"] == "http" and scope["path"] in RECORDED_PATHS else None
+        if writer is None:
+            await self.app(scope, receive, send)
+            return
+
+        arrival = t.time()
+        start = t.perf_counter()
+        body = []
+        response = {"status": None, "latency": None}
+
+        async def recording_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                body.append(message.get("body", b""))
+            return message
+
+        async def recording_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["latency"] = t.perf_counter() - start
+            await send(message)
+
+        try:
+            await self.app(scope, recording_receive, recording_send)
+        finally:
+            raw = b"".join(body)
+            record = {"ts": round(arrival, 6), "path": scope["path"]}
+            try:
+                record["body"] = json.loads(raw) if raw else None
+            except ValueError:
+                record["raw"] = raw.decode(errors="replace")
+            record["status"] = response["status"]
+            if response["latency"] is not None:
+                record["latency_ms"] = round(response["latency"] * 1000, 3)
+            writer.write(record)
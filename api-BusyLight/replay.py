@@ -0,0 +1,186 @@
+# ---------------------------------------------------------------------------------------
+# Project: BusyLight API - Trace replay
+# Author: Evaristo R. Rivieccio Vega - SysAdmin
+# GitHub: https://github.com/evaristorivi
+# LinkedIn: https://www.linkedin.com/in/evaristorivieccio/
+# Web: https://www.evaristorivieccio.es/
+# ---------------------------------------------------------------------------------------
+# Description:
+# Replays a trace recorded by the API (see recorder.py and the [recorder] section of
+# busylight.conf) against API.py loaded in this process on a stubbed LED backend, so
+# real office traffic becomes a repeatable benchmark.
+#
+# - By default requests are sent at their original timing (--speed to compress it);
+#   with --fast they are sent one after another as fast as possible.
+# - The schedule is ignored during the replay so the result does not depend on the time
+#   of day; requests that were rejected as outside of operating hours (403) are skipped.
+# - The report contains the final framebuffer, the latency distribution of the replay
+#   (and the one recorded in production) and the requests whose status differs from
+#   the recorded one.
+# - --save-baseline stores the report; --baseline compares against a stored report and
+#   exits with status 1 if the final framebuffer differs or a latency percentile got
+#   slower than the tolerance allows.
+#
+# Requirements: pip install httpx
+#
+# Example:
+#    python3 replay.py traces/requests.jsonl --fast --save-baseline baseline.json
+#    python3 replay.py traces/requests.jsonl --fast --baseline baseline.json
+# ---------------------------------------------------------------------------------------
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time as t
+from collections import Counter
+from load_simulator import httpx, install_stub_backend, percentile
+from recorder import RECORDED_PATHS, load_trace
+
+PERCENTILES = (50, 95, 99)
+
+
+def distribution(latencies):
+    return {f"p{p}_ms": round(percentile(latencies, p) * 1000, 3) if latencies else None for p in PERCENTILES}
+
+
+async def send(client, record, results):
+    if "raw" in record:
+        request = client.post(record["path"], content=record["raw"], headers={"Content-Type": "application/json"})
+    else:
+        request = client.post(record["path"], json=record.get("body"))
+    start = t.perf_counter()
+    response = await request
+    results.append((record, response.status_code, t.perf_counter() - start))
+
+
+async def replay(args, records):
+    stub = install_stub_backend(args.show_ms)
+    if args.config:
+        os.environ["BUSYLIGHT_CONFIG"] = args.config
+    os.environ["BUSYLIGHT_IGNORE_SCHEDULE"] = "1"  # Same result at any time of day
+    import API
+
+    if API.settings.led_owner != "local":
+        sys.exit("Replay needs owner = local in the [led] section of the config file")
+    # Do not record the replay itself
+    writer, API.trace_writer = API.trace_writer, None
+    if writer is not None:
+        writer.close()
+    API.logger.echo = False  # Nor log it
+    API.logger.configure(API.settings.logging_queue_size, None)
+
+    results = []
+    transport = httpx.ASGITransport(app=API.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://busylight") as client:
+        if args.fast:
+            for record in records:
+                await send(client, record, results)
+        else:
+            first = records[0]["ts"] if records else 0
+            start = t.monotonic()
+            tasks = []
+            for record in records:
+                delay = (record["ts"] - first) / args.speed - (t.monotonic() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.ensure_future(send(client, record, results)))
+            await asyncio.gather(*tasks)
+
+        # Let pending flap damping transitions commit before reading the final frame
+        if API.damper.enabled:
+            await asyncio.sleep(max(API.settings.damping_min_dwell, API.settings.damping_stable_for) + 0.1)
+
+    frame = [f"{color:06x}" for color in API.strip.pixels]
+    return frame, results, stub.frames
+
+
+def build_report(frame, results, frames, skipped):
+    report = {"requests": len(results), "skipped_403": skipped, "frames_pushed": frames,
+              "final_frame": frame, "endpoints": {}}
+    for path in sorted(RECORDED_PATHS):
+        replayed = [latency for record, _, latency in results if record["path"] == path]
+        recorded = [record["latency_ms"] / 1000 for record, _, _ in results
+                    if record["path"] == path and record.get("latency_ms") is not None]
+        statuses = Counter(str(status) for record, status, _ in results if record["path"] == path)
+        report["endpoints"][path] = {
+            "requests": len(replayed),
+            "replay": distribution(replayed),
+            "recorded": distribution(recorded),
+            "statuses": dict(statuses),
+        }
+    report["status_mismatches"] = [
+        {"ts": record["ts"], "path": record["path"], "recorded": record.get("status"), "replayed": status}
+        for record, status, _ in results if record.get("status") is not None and record["status"] != status
+    ]
+    return report
+
+
+# Differences that count as a regression against a baseline report
+def compare(report, baseline, tolerance):
+    problems = []
+    if report["final_frame"] != baseline["final_frame"]:
+        problems.append("final framebuffer differs from the baseline")
+    for path, data in report["endpoints"].items():
+        base = baseline["endpoints"].get(path)
+        if base is None:
+            continue
+        for key, value in data["replay"].items():
+            reference = base["replay"].get(key)
+            # Ignore sub-millisecond noise
+            if value is not None and reference is not None and value > reference * (1 + tolerance) and value - reference > 1:
+                problems.append(f"{path} {key}: {value} ms vs {reference} ms in the baseline")
+    return problems
+
+
+def print_report(report):
+    print(f"Requests: {report['requests']}  Skipped (403): {report['skipped_403']}  "
+          f"Frames pushed: {report['frames_pushed']}  Status mismatches: {len(report['status_mismatches'])}")
+    print(f"{'endpoint':<14}{'requests':>10}{'':>3}" + "".join(f"{f'p{p} ms':>10}" for p in PERCENTILES))
+    for path, data in report["endpoints"].items():
+        for label in ("replay", "recorded"):
+            values = "".join(f"{'-' if v is None else v:>10}" for v in data[label].values())
+            print(f"{path if label == 'replay' else '':<14}{data['requests'] if label == 'replay' else '':>10}"
+                  f"   {label:<9}{values}")
+    print("Final frame:", " ".join(report["final_frame"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a BusyLight request trace")
+    parser.add_argument("trace", help="trace file written by the recorder (rotated files are included)")
+    parser.add_argument("--fast", action="store_true", help="send requests back to back instead of at their original timing")
+    parser.add_argument("--speed", type=float, default=1, help="time compression factor for the original timing")
+    parser.add_argument("--config", help="config file for the in-process API (default: busylight.conf)")
+    parser.add_argument("--show-ms", type=float, default=1.0, help="time spent pushing one frame (stub backend)")
+    parser.add_argument("--baseline", help="report to compare against")
+    parser.add_argument("--save-baseline", help="write the report to this file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed latency increase (0.25 = 25%%)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    records = [record for record in load_trace(args.trace) if record.get("path") in RECORDED_PATHS]
+    replayable = [record for record in records if record.get("status") != 403]
+    frame, results, frames = asyncio.run(replay(args, replayable))
+    report = build_report(frame, results, frames, len(records) - len(replayable))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            problems = compare(report, json.load(baseline_file), args.tolerance)
+        for problem in problems:
+            print("REGRESSION:", problem)
+        if problems:
+            sys.exit(1)
+        print("No regression against the baseline")
+
+if __name__ == "__main__":
+    main()
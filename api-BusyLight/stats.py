@@ -0,0 +1,215 @@
+# ---------------------------------------------------------------------------------------
+# Project: BusyLight API - Occupancy statistics
+# Author: Evaristo R. Rivieccio Vega - SysAdmin
+# GitHub: https://github.com/evaristorivi
+# LinkedIn: https://www.linkedin.com/in/evaristorivieccio/
+# Web: https://www.evaristorivieccio.es/
+# ---------------------------------------------------------------------------------------
+# Description:
+# Keeps a history of the state of each zone ("left" and "right") so the API can answer
+# questions such as "how many minutes was the left desk red last week?".
+#
+# - Every state transition is appended to a fixed-size ring buffer of 10-byte records
+#   (timestamp, zone, state). When the buffer is full the oldest events are overwritten.
+# - Per-zone, per-day totals (seconds spent in each state) are updated when an event
+#   arrives, so queries never rescan the event log.
+# - Daily totals older than `retention_days` are folded into monthly totals, and monthly
+#   totals older than `retention_months` are dropped, so memory stays bounded.
+# ---------------------------------------------------------------------------------------
+
+import struct
+import threading
+import time as t
+from array import array
+from datetime import date, datetime, timedelta
+
+ZONES = ("left", "right")
+STATES = ("off", "green", "red", "orange")
+
+# timestamp (float seconds), zone index, state index
+EVENT = struct.Struct("<dBB")
+
+
+# Fixed-width ring buffer of state transitions
+class EventLog:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffer = bytearray(EVENT.size * capacity)
+        self.start = 0  # Index of the oldest event
+        self.count = 0
+
+    def append(self, timestamp, zone, state):
+        index = (self.start + self.count) % self.capacity
+        EVENT.pack_into(self.buffer, index * EVENT.size, timestamp, zone, state)
+        if self.count < self.capacity:
+            self.count += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for i in range(self.count):
+            index = (self.start + i) % self.capacity
+            yield EVENT.unpack_from(self.buffer, index * EVENT.size)
+
+    # Return a new log with another capacity, keeping the most recent events
+    def resized(self, capacity):
+        new_log = EventLog(capacity)
+        for event in list(self)[-capacity:]:
+            new_log.append(*event)
+        return new_log
+
+
+def _midnight(day):
+    return datetime.combine(day, datetime.min.time()).timestamp()
+
+
+# Split the interval [start, end) at local midnight: yields (date ordinal, seconds)
+def _split_days(start, end):
+    while start < end:
+        day = date.fromtimestamp(start)
+        chunk_end = min(end, _midnight(day + timedelta(days=1)))
+        yield day.toordinal(), chunk_end - start
+        start = chunk_end
+
+
+# First and last date ordinals of a month
+def _month_days(year, month):
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    return date(year, month, 1).toordinal(), next_month.toordinal() - 1
+
+
+def _empty_totals():
+    # One row of seconds per state for every zone
+    return [array("d", bytes(8 * len(STATES))) for _ in ZONES]
+
+
+# Per-zone occupancy with incremental daily (and downsampled monthly) aggregates
+class OccupancyStats:
+    def __init__(self, log_size=4096, retention_days=90, retention_months=24, clock=t.time):
+        self.lock = threading.Lock()
+        self.clock = clock
+        self.events = EventLog(log_size)
+        self.retention_days = retention_days
+        self.retention_months = retention_months
+        self.daily = {}    # date ordinal -> totals
+        self.monthly = {}  # (year, month) -> totals
+        self.downsampled_before = 0  # Days before this ordinal are only in the monthly totals
+        now = clock()
+        # Current state of each zone and when it started
+        self.state = [STATES.index("off")] * len(ZONES)
+        self.since = [now] * len(ZONES)
+
+    def configure(self, log_size, retention_days, retention_months):
+        with self.lock:
+            if log_size != self.events.capacity:
+                self.events = self.events.resized(log_size)
+            self.retention_days = retention_days
+            self.retention_months = retention_months
+            self._downsample(date.fromtimestamp(self.clock()))
+
+    # Move the start of the history back to `timestamp`, before any transition is recorded.
+    # Used by the API workers before they replay the shared transition log.
+    def rebase(self, timestamp):
+        with self.lock:
+            if not len(self.events):
+                self.since = [min(since, timestamp) for since in self.since]
+
+    # Record the new state of a zone ("left", "right" or None for both). Replayed transitions
+    # (with a `timestamp`) older than the current state of the zone are ignored.
+    def record(self, half, state, timestamp=None):
+        replayed = timestamp is not None
+        if timestamp is None:
+            timestamp = self.clock()
+        zones = range(len(ZONES)) if half is None else (ZONES.index(half),)
+        state_index = STATES.index(state)
+        with self.lock:
+            for zone in zones:
+                if self.state[zone] == state_index or (replayed and timestamp < self.since[zone]):
+                    continue  # Not a transition
+                self._accumulate(zone, self.state[zone], self.since[zone], timestamp)
+                self.state[zone] = state_index
+                self.since[zone] = timestamp
+                self.events.append(timestamp, zone, state_index)
+            self._downsample(date.fromtimestamp(timestamp))
+
+    # Add the interval [start, end) spent in `state` to the daily totals
+    def _accumulate(self, zone, state, start, end):
+        for ordinal, seconds in _split_days(start, end):
+            totals = self.daily.get(ordinal)
+            if totals is None:
+                totals = self.daily[ordinal] = _empty_totals()
+            totals[zone][state] += seconds
+
+    def _downsample(self, today):
+        oldest_day = today.toordinal() - self.retention_days
+        self.downsampled_before = max(self.downsampled_before, oldest_day)
+        for ordinal in [ordinal for ordinal in self.daily if ordinal < oldest_day]:
+            day = date.fromordinal(ordinal)
+            month = self.monthly.setdefault((day.year, day.month), _empty_totals())
+            for zone_totals, day_totals in zip(month, self.daily.pop(ordinal)):
+                for state in range(len(STATES)):
+                    zone_totals[state] += day_totals[state]
+        oldest_month = today.year * 12 + today.month - 1 - self.retention_months
+        for key in [key for key in self.monthly if key[0] * 12 + key[1] - 1 < oldest_month]:
+            del self.monthly[key]
+
+    # Minutes per zone and state between two dates (both included), from the aggregates.
+    # The part of the range that was already downsampled is answered with monthly totals.
+    # A month only counts in `total` when its downsampled days are all inside the range.
+    def query(self, start, end, half=None):
+        zones = range(len(ZONES)) if half is None else (ZONES.index(half),)
+        now = self.clock()
+        first_day, last_day = start.toordinal(), end.toordinal()
+        with self.lock:
+            days = {ordinal: [row[:] for row in totals]
+                    for ordinal, totals in self.daily.items()
+                    if first_day <= ordinal <= last_day}
+            months = {}
+            for key, totals in self.monthly.items():
+                month_first, month_last = _month_days(*key)
+                month_last = min(month_last, self.downsampled_before - 1)
+                if month_first <= last_day and first_day <= month_last:
+                    months[key] = ([row[:] for row in totals], first_day <= month_first and month_last <= last_day)
+            # The current (still open) state is not in the aggregates yet. The dates are clamped
+            # to the open interval first: any valid date can be requested (0001-01-01, 9999-12-31)
+            # but not every date has a timestamp.
+            for zone in zones:
+                first = max(start, date.fromtimestamp(self.since[zone]))
+                last = min(end, date.fromtimestamp(now))
+                if first > last:
+                    continue
+                open_start = max(self.since[zone], _midnight(first))
+                open_end = min(now, _midnight(last + timedelta(days=1)))
+                for ordinal, seconds in _split_days(open_start, open_end):
+                    days.setdefault(ordinal, _empty_totals())[zone][self.state[zone]] += seconds
+
+        def minutes(totals):
+            return {ZONES[zone]: {state: round(totals[zone][i] / 60, 1) for i, state in enumerate(STATES)}
+                    for zone in zones}
+
+        result_days = [{"date": date.fromordinal(ordinal).isoformat(), "zones": minutes(totals)}
+                       for ordinal, totals in sorted(days.items())]
+        result_months = [{"month": f"{year:04d}-{month:02d}", "zones": minutes(totals), "in_total": in_total}
+                         for (year, month), (totals, in_total) in sorted(months.items())]
+
+        total = _empty_totals()
+        for totals in list(days.values()) + [totals for totals, in_total in months.values() if in_total]:
+            for zone in zones:
+                for state in range(len(STATES)):
+                    total[zone][state] += totals[zone][state]
+
+        return {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "total": minutes(total),
+            "days": result_days,
+            "months": result_months,
+        }
+
+    def current(self):
+        with self.lock:
+            return {zone: {"state": STATES[self.state[i]], "since": datetime.fromtimestamp(self.since[i]).isoformat()}
+                    for i, zone in enumerate(ZONES)}
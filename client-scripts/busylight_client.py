@@ -0,0 +1,96 @@
+# ---------------------------------------------------------------------------------------
+# Project: BusyLight Clients - Shared logging and signal code
+# Author: Evaristo R. Rivieccio Vega - SysAdmin
+# GitHub: https://github.com/evaristorivi
+# LinkedIn: https://www.linkedin.com/in/evaristorivieccio/
+# Web: https://www.evaristorivieccio.es/
+# ---------------------------------------------------------------------------------------
+# Description:
+# Code used by every client script (microphone clients of each system and the calendar
+# client). The scripts look for this module next to themselves first and then in the
+# client-scripts folder, so copy it next to a script that is installed on its own.
+#
+# Logging: events are JSON lines written to the console and to a rotating log file by a
+# background thread (logging QueueHandler/QueueListener), so the checks never wait for the
+# disk or the console. When the queue is full records are dropped and counted, and the
+# next record written carries the number of records dropped so far:
+#   {"ts": 1725260400.123, "level": "info", "event": "signal_sent", "color": "red", ...}
+#
+# Signals: send_signal() posts a color to /API/signal with a timeout and logs the status,
+# the latency and the response text, or the error.
+# ---------------------------------------------------------------------------------------
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import time
+
+import requests
+
+logger = logging.getLogger("busylight")
+
+# Queue handler that drops records instead of blocking when the queue is full
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, size):
+        super().__init__(queue.Queue(size))
+        self.dropped = 0
+
+    def enqueue(self, record):
+        record.dropped = self.dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+# One JSON object per line: time, level, event, its fields and the records dropped so far
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {"ts": round(record.created, 3), "level": record.levelname.lower(), "event": record.getMessage()}
+        entry.update(getattr(record, "fields", {}))
+        if getattr(record, "dropped", 0):
+            entry["dropped"] = record.dropped
+        return json.dumps(entry)
+
+# The log file and the console are written by a background thread, so the checks never wait for them
+def setup_logging(path, queue_size=1000, max_bytes=1000000, backups=3):
+    handler = DroppingQueueHandler(queue_size)
+    outputs = (logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"),
+               logging.StreamHandler())
+    for output in outputs:
+        output.setFormatter(JsonFormatter())
+    listener = logging.handlers.QueueListener(handler.queue, *outputs)
+    listener.start()
+    atexit.register(listener.stop)
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+# Function to log an event with its fields (never blocks)
+def log_event(event, level=logging.INFO, **fields):
+    logger.log(level, event, extra={"fields": fields})
+
+# Function to send a color to the API, on one half of the strip or on all of it (half=None)
+def send_signal(url, color, half=None, timeout=5):
+    payload = {"color": color}
+
+    if half is not None:
+        payload["half"] = half
+
+    start = time.perf_counter()
+    try:
+        response = requests.post(url, headers={"Content-Type": "application/json"}, data=json.dumps(payload),
+                                 timeout=timeout)
+    except requests.RequestException as e:
+        log_event("signal_error", logging.ERROR, color=color, error=str(e))
+        return
+    latency_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    # The body is logged as text: error pages (403 outside of operating hours, 429, 503,
+    # a proxy...) are not always JSON
+    if response.ok:
+        log_event("signal_sent", color=color, status=response.status_code, latency_ms=latency_ms,
+                  response=response.text[:200])
+    else:
+        log_event("signal_rejected", logging.WARNING, color=color, status=response.status_code,
+                  latency_ms=latency_ms, response=response.text[:200])
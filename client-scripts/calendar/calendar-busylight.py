@@ -0,0 +1,234 @@
+# ---------------------------------------------------------------------------------------
+# Project: BusyLight Calendar Client
+# Author: Evaristo R. Rivieccio Vega - SysAdmin
+# GitHub: https://github.com/evaristorivi
+# LinkedIn: https://www.linkedin.com/in/evaristorivieccio/
+# Web: https://www.evaristorivieccio.es/
+# ---------------------------------------------------------------------------------------
+# Description:
+# This Python script sets the BusyLight from a local (or exported) ICS calendar, so the
+# light changes exactly when a meeting starts instead of when the microphone is opened.
+#
+# - `LEAD_MINUTES` before a meeting the light turns "orange".
+# - When the meeting starts the light turns "red", and "green" when it ends.
+#
+# Key Functionalities:
+#
+# 1. **Interval Index**: Every meeting in the calendar, with its recurrences expanded for
+#    the next `HORIZON_DAYS` days, goes into a sorted list of non-overlapping busy intervals.
+#    Finding the current state and the next change is a binary search.
+#
+# 2. **Exact Timers**: The script sleeps until the next boundary (orange, red or green)
+#    instead of polling, so the light changes on time.
+#
+# 3. **Incremental Rebuild**: When the ICS file changes, only the events whose definition
+#    changed (grouped by UID, including their recurrence overrides) are expanded again.
+#
+# 4. **Microphone**: A call that runs past the end of its meeting must keep the light red.
+#    Set `MIC_COMMAND` to a command that exits with status 0 while the microphone is in use:
+#    it is checked every `MIC_CHECK_INTERVAL` seconds and the light is red while it reports
+#    a call, whatever the calendar says.
+#
+# Free (transparent), cancelled and all-day events are ignored.
+#
+# Usage:
+# 1. Install the dependencies: pip install -r requirements.txt
+# 2. Update `base_url`, `ICS_PATH` and optionally `MIC_COMMAND`.
+# 3. Run this script. Do not run a microphone client on the same half of the strip: both
+#    would send their own state and the last signal would win (a call past the end of a
+#    meeting would show green). Use `MIC_COMMAND` instead, or give each client its own half.
+#
+# Example:
+#    python3 calendar-busylight.py
+#
+# ---------------------------------------------------------------------------------------
+
+import bisect
+import hashlib
+import logging
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+import icalendar
+import recurring_ical_events
+
+# busylight_client.py (logging and signals shared by the clients) is looked up next to this
+# script first, then in client-scripts/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import busylight_client
+from busylight_client import log_event
+
+# Define the base URL for your API
+base_url = "http://192.168.1.129:5000/API/signal"  # Change according to your API server address
+
+# Configuration
+USE_SHARED_MODE = True  # Set to False for full mode, True for shared mode
+SHARED_SIDE = "right"  # Options: "left" or "right", only used if USE_SHARED_MODE is True
+ICS_PATH = os.path.expanduser("~/calendar.ics")  # Local or exported ICS calendar
+LEAD_MINUTES = 5  # Minutes before a meeting the light turns orange
+HORIZON_DAYS = 7  # Days of recurring events expanded ahead
+FILE_CHECK_INTERVAL = 30  # Seconds between checks of the ICS file modification time
+MIC_COMMAND = None  # Command exiting with 0 while the microphone is in use, e.g. "pactl list short source-outputs | grep -q ."
+MIC_CHECK_INTERVAL = 5  # Seconds between checks of MIC_COMMAND
+REQUEST_TIMEOUT = 5  # Seconds to wait for the API before giving up on a signal
+LOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "busylight-client.log")  # JSON lines, rotated
+LOG_QUEUE_SIZE = 1000  # Records waiting to be written; further records are dropped and counted
+
+
+# Sorted, non-overlapping busy intervals built from an ICS calendar
+class MeetingIndex:
+    def __init__(self, lead=timedelta(minutes=LEAD_MINUTES), horizon=timedelta(days=HORIZON_DAYS)):
+        self.lead = lead.total_seconds()
+        self.horizon = horizon
+        self.window = None  # (start, end) of the expanded period
+        self.groups = {}    # UID -> (hash of its components, [(start, end), ...])
+        self.starts = []
+        self.ends = []
+
+    # Parse the calendar and re-expand only the events that changed. Returns the number
+    # of event groups expanded again.
+    def rebuild(self, data, now=None):
+        now = now or datetime.now(timezone.utc)
+        calendar = icalendar.Calendar.from_ical(data)
+
+        window = (now - timedelta(days=1), now + self.horizon)
+        window_moved = self.window is None or window[1] - self.window[1] > timedelta(hours=12)
+        if window_moved:
+            self.window = window
+
+        components = {}
+        for component in calendar.walk("VEVENT"):
+            components.setdefault(str(component.get("UID", "")), []).append(component)
+
+        expanded = 0
+        groups = {}
+        for uid, events in components.items():
+            digest = hashlib.sha1(b"".join(sorted(event.to_ical() for event in events))).hexdigest()
+            cached = self.groups.get(uid)
+            if cached is not None and cached[0] == digest and not window_moved:
+                groups[uid] = cached
+                continue
+            groups[uid] = (digest, self._expand(calendar, events))
+            expanded += 1
+        self.groups = groups
+        self._merge()
+        return expanded
+
+    # Busy intervals of one event group within the current window
+    def _expand(self, calendar, events):
+        single = icalendar.Calendar()
+        for timezone_component in calendar.walk("VTIMEZONE"):
+            single.add_component(timezone_component)
+        for event in events:
+            single.add_component(event)
+
+        intervals = []
+        for occurrence in recurring_ical_events.of(single).between(*self.window):
+            start = occurrence.get("DTSTART").dt
+            end = occurrence.get("DTEND").dt if occurrence.get("DTEND") else None
+            if not isinstance(start, datetime):
+                continue  # All-day event
+            if str(occurrence.get("TRANSP", "OPAQUE")).upper() == "TRANSPARENT":
+                continue  # Marked as free
+            if str(occurrence.get("STATUS", "")).upper() == "CANCELLED":
+                continue
+            if end is None:
+                end = start + (occurrence.get("DURATION").dt if occurrence.get("DURATION") else timedelta(0))
+            intervals.append((_timestamp(start), _timestamp(end)))
+        return intervals
+
+    # Merge the intervals of every group into the sorted, non-overlapping index
+    def _merge(self):
+        intervals = sorted(interval for _, group in self.groups.values() for interval in group)
+        starts, ends = [], []
+        for start, end in intervals:
+            if end <= start:
+                continue
+            if ends and start <= ends[-1]:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        self.starts, self.ends = starts, ends
+
+    # Color for `now` (timestamp) and the timestamp of the next change (None if no more)
+    def state_at(self, now):
+        i = bisect.bisect_right(self.starts, now) - 1
+        if i >= 0 and now < self.ends[i]:
+            return "red", self.ends[i]
+        if i + 1 < len(self.starts):
+            next_start = self.starts[i + 1]
+            if now >= next_start - self.lead:
+                return "orange", next_start
+            return "green", next_start - self.lead
+        return "green", None
+
+
+def _timestamp(value):
+    if value.tzinfo is None:
+        value = value.astimezone()  # Floating time: local time of this computer
+    return value.timestamp()
+
+
+# Function to check if the microphone is in use with MIC_COMMAND
+def is_microphone_in_use():
+    try:
+        result = subprocess.run(MIC_COMMAND, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                timeout=MIC_CHECK_INTERVAL)
+        return result.returncode == 0
+    except (OSError, subprocess.TimeoutExpired) as e:
+        log_event("check_error", logging.ERROR, check="microphone", error=str(e))
+        return False
+
+
+# Function to send a signal to the API
+def send_signal(color):
+    busylight_client.send_signal(base_url, color, SHARED_SIDE if USE_SHARED_MODE else None, REQUEST_TIMEOUT)
+
+
+def main():
+    busylight_client.setup_logging(LOG_PATH, LOG_QUEUE_SIZE)
+    index = MeetingIndex()
+    mtime = None
+    last_rebuild = 0
+    state = None
+
+    while True:
+        now = time.time()
+        try:
+            current_mtime = os.stat(ICS_PATH).st_mtime_ns
+        except OSError as e:
+            log_event("calendar_error", logging.ERROR, path=ICS_PATH, error=str(e))
+            current_mtime = None
+
+        # Rebuild when the file changes, and at least hourly so the expanded window moves on
+        if current_mtime is not None and (current_mtime != mtime or now - last_rebuild > 3600):
+            try:
+                with open(ICS_PATH, "rb") as ics:
+                    expanded = index.rebuild(ics.read())
+                log_event("calendar_loaded", intervals=len(index.starts), expanded=expanded)
+                mtime = current_mtime
+                last_rebuild = now
+            except (OSError, ValueError) as e:
+                log_event("calendar_error", logging.ERROR, path=ICS_PATH, error=str(e))
+
+        # A call keeps the light red, also after the end of its meeting
+        color, next_change = index.state_at(now)
+        mic_in_use = MIC_COMMAND is not None and is_microphone_in_use()
+        if mic_in_use:
+            color = "red"
+        if color != state:
+            log_event("state_change", color=color, next_change=next_change, microphone=mic_in_use)
+            send_signal(color)
+            state = color
+
+        # Sleep until the next boundary, waking up regularly to notice calendar changes and calls
+        wake_up = now + (FILE_CHECK_INTERVAL if MIC_COMMAND is None else min(FILE_CHECK_INTERVAL, MIC_CHECK_INTERVAL))
+        if next_change is not None:
+            wake_up = min(wake_up, next_change)
+        time.sleep(max(0.0, wake_up - time.time()))
+
+if __name__ == "__main__":
+    main()
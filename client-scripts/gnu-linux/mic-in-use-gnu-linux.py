@@ -22,11 +22,19 @@
 # 3. **Microphone Monitoring**: Uses system commands (`pactl`, `arecord`) to check the microphone's 
 #    status and determine if it is in use.
 # 
-# 4. **Signal Transmission**: Sends a POST request to the BusyLight API endpoint to indicate whether 
-#    the microphone is in use ("red") or not ("green").
+# 4. **Camera Monitoring**: When `USE_CAMERA_DETECTION` is True, finds processes holding a
+#    `/dev/video*` device open by scanning `/proc/<pid>/fd`. The scan is incremental: processes
+#    are cached by PID and start time, processes we cannot inspect (other users, kernel threads)
+#    are skipped once and for all, and the file descriptors of a process are only resolved again
+#    when its set of fds changed (the kernel reuses the lowest free fd number, so a closed socket
+#    and a newly opened camera can share one). A full rescan runs every `CAMERA_FULL_RESCAN`
+#    seconds as a safety net, for a number reused with no other change in the set.
 # 
-# 5. **Main Loop**: Continuously checks the microphone status and sends appropriate signals when a 
-#    change is detected.
+# 5. **Signal Transmission**: Sends a POST request to the BusyLight API endpoint to indicate whether 
+#    the microphone or the camera is in use ("red") or not ("green").
+# 
+# 6. **Main Loop**: Continuously checks the microphone and camera status and sends appropriate
+#    signals when a change is detected.
 # 
 # Usage:
 # 1. Ensure Python and the `requests` library are installed.
@@ -39,10 +47,17 @@
 #
 # ---------------------------------------------------------------------------------------
 
+import logging
+import os
 import subprocess
+import sys
 import time
-import requests
-import json
+
+# busylight_client.py (logging and signals shared by the clients) is looked up next to this
+# script first, then in client-scripts/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import busylight_client
+from busylight_client import log_event
 
 # Define the base URL for your API
 base_url = "http://192.168.1.129:5000/API/signal"  # Change according to your API server address
@@ -50,6 +65,11 @@ base_url = "http://192.168.1.129:5000/API/signal"  # Change according to your AP
 # Configuration
 USE_SHARED_MODE = True  # Set to False for full mode, True for shared mode
 SHARED_SIDE = "right"  # Options: "left" or "right", only used if USE_SHARED_MODE is True
+USE_CAMERA_DETECTION = True  # Set to False to check only the microphone
+CAMERA_FULL_RESCAN = 60  # Seconds between full rescans of the open file descriptors
+REQUEST_TIMEOUT = 5  # Seconds to wait for the API before giving up on a signal
+LOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "busylight-client.log")  # JSON lines, rotated
+LOG_QUEUE_SIZE = 1000  # Records waiting to be written; further records are dropped and counted
 
 # Detect the audio system (PulseAudio, PipeWire, or ALSA)
 def detect_audio_system():
@@ -82,7 +102,7 @@ def is_microphone_in_use_pulseaudio():
         result = subprocess.run(['pactl', 'list', 'source-outputs'], capture_output=True, text=True)
         return bool(result.stdout.strip())
     except Exception as e:
-        print(f"Error executing command: {e}")
+        log_event("check_error", logging.ERROR, check="microphone", error=str(e))
         return False
 
 # Function to check if the microphone is in use with ALSA
@@ -91,58 +111,137 @@ def is_microphone_in_use_alsa():
         result = subprocess.run(['arecord', '-l'], capture_output=True, text=True)
         return bool(result.stdout.strip())
     except Exception as e:
-        print(f"Error executing command: {e}")
+        log_event("check_error", logging.ERROR, check="microphone", error=str(e))
         return False
 
+# Detects processes holding a camera (/dev/video*) open by scanning /proc/<pid>/fd incrementally.
+# `proc_root` can point to a fixture tree for testing.
+class CameraMonitor:
+    def __init__(self, proc_root="/proc", device_prefix="/dev/video", full_rescan=CAMERA_FULL_RESCAN):
+        self.proc_root = proc_root
+        self.device_prefix = device_prefix
+        self.full_rescan = full_rescan
+        self.last_full_scan = 0
+        # pid -> (start time, {fd: is camera}) or (start time, None) for processes we skip
+        self.processes = {}
+
+    # Start time of a process (field 22 of /proc/<pid>/stat), to detect reused PIDs
+    def _start_time(self, pid):
+        try:
+            with open(os.path.join(self.proc_root, pid, "stat"), "rb") as stat:
+                fields = stat.read().rsplit(b")", 1)[1].split()
+            return int(fields[19])
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def _is_kernel_thread(self, pid):
+        try:
+            with open(os.path.join(self.proc_root, pid, "cmdline"), "rb") as cmdline:
+                return not cmdline.read(1)
+        except OSError:
+            return True
+
+    # Update the cached fds of a process. Returns None to skip it.
+    def _scan_fds(self, pid, known):
+        fd_dir = os.path.join(self.proc_root, pid, "fd")
+        try:
+            fds = os.listdir(fd_dir)
+        except PermissionError:
+            return None  # Process of another user: we cannot inspect it
+        except OSError:
+            return {}  # Process exited meanwhile
+        # Same fds as on the previous tick: keep them. Otherwise resolve them all again, as a
+        # number still in the set may have been closed and reused for another file meanwhile.
+        if known and known.keys() == set(fds):
+            return known
+        current = {}
+        for fd in fds:
+            try:
+                current[fd] = os.readlink(os.path.join(fd_dir, fd)).startswith(self.device_prefix)
+            except OSError:
+                pass  # fd closed meanwhile
+        return current
+
+    def is_camera_in_use(self):
+        now = time.monotonic()
+        if now - self.last_full_scan >= self.full_rescan:
+            # Forget the resolved fds: an fd number closed and reused for a camera with no other
+            # change in the fd set of its process would otherwise go unnoticed
+            self.processes = {pid: (start, None if fds is None else {}) for pid, (start, fds) in self.processes.items()}
+            self.last_full_scan = now
+
+        try:
+            pids = [name for name in os.listdir(self.proc_root) if name.isdigit()]
+        except OSError as e:
+            log_event("check_error", logging.ERROR, check="camera", error=str(e))
+            return False
+
+        processes = {}
+        in_use = False
+        for pid in pids:
+            start = self._start_time(pid)
+            if start is None:
+                continue  # Exited meanwhile
+            cached = self.processes.get(pid)
+            if cached is not None and cached[0] == start:
+                fds = cached[1]
+            elif self._is_kernel_thread(pid):
+                fds = None
+            else:
+                fds = {}
+            if fds is not None:
+                fds = self._scan_fds(pid, fds)
+                if fds is not None and any(fds.values()):
+                    in_use = True
+            processes[pid] = (start, fds)
+
+        # Processes that exited are dropped from the cache
+        self.processes = processes
+        return in_use
+
 # Function to send a signal to the API
 def send_signal(color):
-    payload = {"color": color}
-    
-    if USE_SHARED_MODE:
-        payload["half"] = SHARED_SIDE
-    
-    response = requests.post(base_url, headers={"Content-Type": "application/json"}, data=json.dumps(payload))
-    
-    print(f"Response Code: {response.status_code}")
-    print(f"Response Body: {response.json()}")
+    busylight_client.send_signal(base_url, color, SHARED_SIDE if USE_SHARED_MODE else None, REQUEST_TIMEOUT)
 
 def main():
+    busylight_client.setup_logging(LOG_PATH, LOG_QUEUE_SIZE)
+
     # Detect the audio system
     audio_system = detect_audio_system()
 
     if audio_system == 'pulseaudio' or audio_system == 'pipewire':
-        print(f"Using audio system: {audio_system}")
+        log_event("audio_system", name=audio_system)
         is_microphone_in_use = is_microphone_in_use_pulseaudio
     elif audio_system == 'alsa':
-        print("Using audio system: ALSA")
+        log_event("audio_system", name="alsa")
         is_microphone_in_use = is_microphone_in_use_alsa
     else:
-        print("No compatible audio system detected.")
+        log_event("audio_system", logging.ERROR, name=None, error="No compatible audio system detected")
         return
 
-    mic_in_use = is_microphone_in_use()
+    camera_monitor = CameraMonitor() if USE_CAMERA_DETECTION else None
 
-    if mic_in_use:
-        print("Initial check: The microphone is in use.")
-        send_signal("red")
-    else:
-        print("Initial check: The microphone is not in use.")
-        send_signal("green")
+    # Busy if the microphone or the camera is in use. Returns (busy, microphone, camera).
+    def is_busy():
+        mic_in_use = is_microphone_in_use()
+        camera_in_use = camera_monitor is not None and camera_monitor.is_camera_in_use()
+        return mic_in_use or camera_in_use, mic_in_use, camera_in_use
+
+    busy, mic_in_use, camera_in_use = is_busy()
+
+    log_event("state_change", initial=True, busy=busy, microphone=mic_in_use, camera=camera_in_use)
+    send_signal("red" if busy else "green")
 
-    state = mic_in_use
+    state = busy
 
     while True:
-        mic_in_use = is_microphone_in_use()
+        busy, mic_in_use, camera_in_use = is_busy()
 
-        if mic_in_use != state:
-            if mic_in_use:
-                print("The microphone is in use.")
-                send_signal("red")
-            else:
-                print("The microphone is not in use.")
-                send_signal("green")
-            
-            state = mic_in_use
+        if busy != state:
+            log_event("state_change", initial=False, busy=busy, microphone=mic_in_use, camera=camera_in_use)
+            send_signal("red" if busy else "green")
+
+            state = busy
 
         time.sleep(5)
 
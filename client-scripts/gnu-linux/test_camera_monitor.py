@@ -0,0 +1,107 @@
+# ---------------------------------------------------------------------------------------
+# Project: BusyLight Linux Client - Camera detection tests
+# Author: Evaristo R. Rivieccio Vega - SysAdmin
+# GitHub: https://github.com/evaristorivieccio
+# LinkedIn: https://www.linkedin.com/in/evaristorivieccio/
+# Web: https://www.evaristorivieccio.es/
+# ---------------------------------------------------------------------------------------
+# Description:
+# Runs CameraMonitor of mic-in-use-gnu-linux.py against a fake /proc tree (stat, cmdline
+# and fd symlinks in a temporary folder): new fds, exited and reused PIDs, and fd numbers
+# closed and reused for a camera.
+#
+# Example (with the client requirements installed):
+#    venv/bin/python3 -m unittest test_camera_monitor
+# ---------------------------------------------------------------------------------------
+
+import importlib.util
+import os
+import shutil
+import tempfile
+import unittest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mic-in-use-gnu-linux.py")
+spec = importlib.util.spec_from_file_location("mic_in_use_gnu_linux", SCRIPT)
+client = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(client)
+
+CAMERA = "/dev/video0"
+SOCKET = "socket:[4242]"
+
+
+class CameraMonitorTest(unittest.TestCase):
+    def setUp(self):
+        self.proc = tempfile.mkdtemp()
+        self.monitor = client.CameraMonitor(proc_root=self.proc, full_rescan=3600)
+
+    def tearDown(self):
+        shutil.rmtree(self.proc)
+
+    # Fake process: field 22 of stat is the start time, fds are symlinks to their targets
+    def add_process(self, pid, start=100, fds=None):
+        directory = os.path.join(self.proc, str(pid))
+        os.makedirs(os.path.join(directory, "fd"))
+        with open(os.path.join(directory, "stat"), "w") as stat:
+            stat.write(f"{pid} (browser) S " + "0 " * 18 + f"{start} 0 0\n")
+        with open(os.path.join(directory, "cmdline"), "wb") as cmdline:
+            cmdline.write(b"browser\0")
+        for fd, target in (fds or {}).items():
+            self.set_fd(pid, fd, target)
+
+    def set_fd(self, pid, fd, target):
+        path = os.path.join(self.proc, str(pid), "fd", str(fd))
+        if os.path.lexists(path):
+            os.remove(path)
+        if target is not None:
+            os.symlink(target, path)
+
+    def remove_process(self, pid):
+        shutil.rmtree(os.path.join(self.proc, str(pid)))
+
+    def test_new_fd(self):
+        self.add_process(10, fds={0: "/dev/null", 3: SOCKET})
+        self.assertFalse(self.monitor.is_camera_in_use())
+        self.set_fd(10, 4, CAMERA)
+        self.assertTrue(self.monitor.is_camera_in_use())
+        self.set_fd(10, 4, None)
+        self.assertFalse(self.monitor.is_camera_in_use())
+
+    def test_exited_pid(self):
+        self.add_process(10, fds={3: CAMERA})
+        self.add_process(11, fds={3: SOCKET})
+        self.assertTrue(self.monitor.is_camera_in_use())
+        self.remove_process(10)
+        self.assertFalse(self.monitor.is_camera_in_use())
+        self.assertEqual(set(self.monitor.processes), {"11"})
+
+    def test_reused_pid(self):
+        self.add_process(10, fds={3: SOCKET})
+        self.assertFalse(self.monitor.is_camera_in_use())
+        # Another process with the same PID and the same fd numbers
+        self.remove_process(10)
+        self.add_process(10, start=200, fds={3: CAMERA})
+        self.assertTrue(self.monitor.is_camera_in_use())
+
+    def test_reused_fd(self):
+        self.add_process(10, fds={3: SOCKET, 4: "pipe:[7]"})
+        self.assertFalse(self.monitor.is_camera_in_use())
+        # The socket is closed and the camera gets its number, together with a buffer fd
+        self.set_fd(10, 3, CAMERA)
+        self.set_fd(10, 5, "anon_inode:dmabuf")
+        self.assertTrue(self.monitor.is_camera_in_use())
+        # The camera is closed and a socket reuses its number
+        self.set_fd(10, 3, SOCKET)
+        self.set_fd(10, 5, None)
+        self.assertFalse(self.monitor.is_camera_in_use())
+
+    def test_reused_fd_same_set(self):
+        self.add_process(10, fds={3: SOCKET})
+        self.assertFalse(self.monitor.is_camera_in_use())
+        # Same fd set: only the full rescan resolves the reused number again
+        self.set_fd(10, 3, CAMERA)
+        self.monitor.last_full_scan -= self.monitor.full_rescan
+        self.assertTrue(self.monitor.is_camera_in_use())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -36,10 +36,17 @@
 #
 # ---------------------------------------------------------------------------------------
 
+import logging
+import os
 import subprocess
+import sys
 import time
-import requests
-import json
+
+# busylight_client.py (logging and signals shared by the clients) is looked up next to this
+# script first, then in client-scripts/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+import busylight_client
+from busylight_client import log_event
 
 # Define the base URL for your API
 base_url = "http://192.168.1.129:5000/API/signal"  # CHANGES ACCORDING TO THE ADDRESS OF YOUR API SERVER
@@ -47,24 +54,13 @@ base_url = "http://192.168.1.129:5000/API/signal"  # CHANGES ACCORDING TO THE AD
 # Configuration
 USE_SHARED_MODE = True  # Set to False for full mode, True for shared mode
 SHARED_SIDE = "right"  # Options: "left" or "right", only used if USE_SHARED_MODE is True
+REQUEST_TIMEOUT = 5  # Seconds to wait for the API before giving up on a signal
+LOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "busylight-client.log")  # JSON lines, rotated
+LOG_QUEUE_SIZE = 1000  # Records waiting to be written; further records are dropped and counted
 
-# Function to send a POST request
+# Function to send a signal to the API
 def send_signal(color):
-    # Create the request payload
-    payload = {
-        "color": color
-    }
-
-    # Add the half key to the payload only if shared mode is enabled
-    if USE_SHARED_MODE:
-        payload["half"] = SHARED_SIDE
-    
-    # Send the POST request
-    response = requests.post(base_url, headers={"Content-Type": "application/json"}, data=json.dumps(payload))
-    
-    # Print the result
-    print(f"Response Code: {response.status_code}")
-    print(f"Response Body: {response.json()}")
+    busylight_client.send_signal(base_url, color, SHARED_SIDE if USE_SHARED_MODE else None, REQUEST_TIMEOUT)
 
 # Function to check if the microphone is in use
 def is_microphone_in_use():
@@ -96,19 +92,17 @@ def is_microphone_in_use():
         return int(wc_result.stdout.strip()) > 0
 
     except Exception as e:
-        print(f"Error executing the command: {e}")
+        log_event("check_error", logging.ERROR, error=str(e))
         return False
 
 def main():
+    busylight_client.setup_logging(LOG_PATH, LOG_QUEUE_SIZE)
+
     # Check the microphone state on startup and send the initial signal
     mic_in_use = is_microphone_in_use()
 
-    if mic_in_use:
-        print("Initial check: The microphone is in use.")
-        send_signal("red")
-    else:
-        print("Initial check: The microphone is not in use.")
-        send_signal("green")
+    log_event("state_change", initial=True, in_use=mic_in_use)
+    send_signal("red" if mic_in_use else "green")
 
     # Set the initial state based on the microphone's current status
     state = mic_in_use
@@ -119,12 +113,8 @@ def main():
 
         # If the microphone state changes, send the appropriate signal
         if mic_in_use != state:
-            if mic_in_use:
-                print("The microphone is in use.")
-                send_signal("red")
-            else:
-                print("The microphone is not in use.")
-                send_signal("green")
+            log_event("state_change", initial=False, in_use=mic_in_use)
+            send_signal("red" if mic_in_use else "green")
             # Update the state
             state = mic_in_use
 
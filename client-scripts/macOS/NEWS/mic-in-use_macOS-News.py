@@ -34,10 +34,16 @@
 #
 # ---------------------------------------------------------------------------------------
 
+import os
+import sys
 import time
 import atomacos
-import requests
-import json
+
+# busylight_client.py (logging and signals shared by the clients) is looked up next to this
+# script first, then in client-scripts/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+import busylight_client
+from busylight_client import log_event
 
 # Define the base URL for your API
 base_url = "http://192.168.1.129:5000/API/signal" #CHANGES ACCORDING TO THE ADDRESS OF YOUR API SERVER
@@ -45,24 +51,13 @@ base_url = "http://192.168.1.129:5000/API/signal" #CHANGES ACCORDING TO THE ADDR
 # Configuration
 USE_SHARED_MODE = True  # Set to False for full mode, True for shared mode
 SHARED_SIDE = "left"  # Options: "left" or "right", only used if USE_SHARED_MODE is True
+REQUEST_TIMEOUT = 5  # Seconds to wait for the API before giving up on a signal
+LOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "busylight-client.log")  # JSON lines, rotated
+LOG_QUEUE_SIZE = 1000  # Records waiting to be written; further records are dropped and counted
 
-# Function to send a POST request
+# Function to send a signal to the API
 def send_signal(color):
-    # Create the request payload
-    payload = {
-        "color": color
-    }
-
-    # Add the half key to the payload only if shared mode is enabled
-    if USE_SHARED_MODE:
-        payload["half"] = SHARED_SIDE
-    
-    # Send the POST request
-    response = requests.post(base_url, headers={"Content-Type": "application/json"}, data=json.dumps(payload))
-    
-    # Print the result
-    print(f"Response Code: {response.status_code}")
-    print(f"Response Body: {response.json()}")
+    busylight_client.send_signal(base_url, color, SHARED_SIDE if USE_SHARED_MODE else None, REQUEST_TIMEOUT)
 
 # Get a reference to the Control Center of macOS
 sysui = atomacos.getAppRefByBundleId('com.apple.controlcenter')
@@ -89,16 +84,15 @@ def check_mic_state():
     # Determine if the microphone is in use
     return bool(descs)
 
+# Start the background log writer
+busylight_client.setup_logging(LOG_PATH, LOG_QUEUE_SIZE)
+
 # Check initial microphone state
 is_mic_on = check_mic_state()
 
 # Send the initial signal based on the microphone state
-if is_mic_on:
-    print("The microphone is in use.")
-    send_signal("red")
-else:
-    print("The microphone is not in use.")
-    send_signal("green")
+log_event("state_change", initial=True, in_use=is_mic_on)
+send_signal("red" if is_mic_on else "green")
 
 # Update the initial state
 state = {"incall": is_mic_on}
@@ -113,12 +107,8 @@ while True:
 
     # Compare the new state with the previous state
     if new_state != state:
-        if is_mic_on:
-            print("The microphone is in use.")
-            send_signal("red")
-        else:
-            print("The microphone is not in use.")
-            send_signal("green")
+        log_event("state_change", initial=False, in_use=is_mic_on)
+        send_signal("red" if is_mic_on else "green")
         
         # Update the state
         state = new_state
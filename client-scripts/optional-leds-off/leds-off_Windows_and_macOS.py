@@ -51,12 +51,17 @@ def send_off_signal():
     if USE_SHARED_MODE:
         payload["half"] = SHARED_SIDE
     
-    # Send the POST request
-    response = requests.post(base_url, headers={"Content-Type": "application/json"}, data=json.dumps(payload))
-    
-    # Print the result
+    # Send the POST request (do not hold up the shutdown if the API does not answer)
+    try:
+        response = requests.post(base_url, headers={"Content-Type": "application/json"}, data=json.dumps(payload),
+                                 timeout=5)
+    except requests.RequestException as e:
+        print(f"Error sending signal: {e}")
+        return
+
+    # Print the result (as text: error pages are not always JSON)
     print(f"Response Code: {response.status_code}")
-    print(f"Response Body: {response.json()}")
+    print(f"Response Body: {response.text}")
 
 if __name__ == "__main__":
     send_off_signal()
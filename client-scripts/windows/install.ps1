@@ -25,7 +25,8 @@
 # - Create a new scheduled task to run the BusyLight client script with the highest privileges.
 #
 # Usage:
-# 1. Ensure that `mic-in-use-windows.py` and `requirements.txt` are in the same folder. 
+# 1. Ensure that `mic-in-use-windows.py` and `requirements.txt` are in the same folder, and
+#    `busylight_client.py` (code shared by the clients) in the folder above it. 
 
 # 2. Run this PowerShell script as an Administrator to install and configure the BusyLight 
 #    client.
@@ -39,6 +40,7 @@
 $installPath = "C:\busylight"
 $pythonScriptPath = "$installPath\mic-in-use-windows.py"
 $requirementsPath = "$installPath\requirements.txt"
+$sharedModulePath = "$installPath\busylight_client.py"
 $taskName = "MicInUseTask"
 $taskDescription = "Task to run the mic-in-use-windows.py script at logon."
 
@@ -68,6 +70,15 @@ if (Test-Path "$scriptDirectory\requirements.txt") {
     exit 1
 }
 
+# The logging and signal code shared by the clients is copied (not moved), other clients use it too
+if (Test-Path "$scriptDirectory\..\busylight_client.py") {
+    Write-Output "Copying busylight_client.py to $installPath..."
+    Copy-Item -Path "$scriptDirectory\..\busylight_client.py" -Destination $sharedModulePath -Force
+} else {
+    Write-Error "busylight_client.py not found in the parent of the script directory."
+    exit 1
+}
+
 # Check if Python is installed
 $pythonPath = (Get-Command python -ErrorAction SilentlyContinue).Source
 if (-not $pythonPath) {
@@ -30,31 +30,31 @@
 # ---------------------------------------------------------------------------------------
 
 
+import os
 import psutil
+import sys
 import time
-import requests
-import json
 from pycaw.pycaw import AudioUtilities, IAudioSessionControl2
 
+# busylight_client.py (logging and signals shared by the clients) is looked up next to this
+# script first, then in client-scripts/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import busylight_client
+from busylight_client import log_event
+
 # Define the base URL for your API
 base_url = "http://192.168.1.129:5000/API/signal"  # CHANGES ACCORDING TO THE ADDRESS OF YOUR API SERVER
 
 # Configuration
 USE_SHARED_MODE = True  # Set to False for full mode, True for shared mode
 SHARED_SIDE = "right"  # Options: "left" or "right", only used if USE_SHARED_MODE is True
+REQUEST_TIMEOUT = 5  # Seconds to wait for the API before giving up on a signal
+LOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "busylight-client.log")  # JSON lines, rotated
+LOG_QUEUE_SIZE = 1000  # Records waiting to be written; further records are dropped and counted
 
 def send_signal(color):
     """Send the signal to change the color of the BusyLight."""
-    payload = {"color": color}
-    if USE_SHARED_MODE:
-        payload["half"] = SHARED_SIDE
-    
-    try:
-        response = requests.post(base_url, headers={"Content-Type": "application/json"}, data=json.dumps(payload))
-        print(f"Response Code: {response.status_code}")
-        print(f"Response Body: {response.json()}")
-    except requests.RequestException as e:
-        print(f"Error sending signal: {e}")
+    busylight_client.send_signal(base_url, color, SHARED_SIDE if USE_SHARED_MODE else None, REQUEST_TIMEOUT)
 
 # List of processes to ignore
 ignored_processes = {'simhubwpf.exe'}
@@ -90,18 +90,15 @@ def is_microphone_in_use():
     return None
 
 def main():
+    busylight_client.setup_logging(LOG_PATH, LOG_QUEUE_SIZE)
     mic_in_use = False
 
     # Check initial state and send the first signal
     process_name = is_microphone_in_use()
     mic_in_use = process_name in communication_apps
 
-    if mic_in_use:
-        print(f"The microphone is in use by: {process_name}")
-        send_signal("red")
-    else:
-        print("The microphone is not in use.")
-        send_signal("green")
+    log_event("state_change", initial=True, in_use=mic_in_use, process=process_name if mic_in_use else None)
+    send_signal("red" if mic_in_use else "green")
 
     # Main loop
     while True:
@@ -109,12 +106,9 @@ def main():
         new_mic_in_use = process_name in communication_apps
 
         if new_mic_in_use != mic_in_use:
-            if new_mic_in_use:
-                print(f"The microphone is in use by: {process_name}")
-                send_signal("red")
-            else:
-                print("The microphone is not in use.")
-                send_signal("green")
+            log_event("state_change", initial=False, in_use=new_mic_in_use,
+                      process=process_name if new_mic_in_use else None)
+            send_signal("red" if new_mic_in_use else "green")
 
             mic_in_use = new_mic_in_use
         